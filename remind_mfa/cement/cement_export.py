@@ -1,9 +1,9 @@
-from plotly import colors as plc
 import flodym as fd
 from typing import TYPE_CHECKING
 
 from remind_mfa.common.common_export import CommonDataExporter
 from remind_mfa.common.common_cfg import CementVisualizationCfg
+from remind_mfa.common.profiling import profiled
 
 if TYPE_CHECKING:
     from remind_mfa.cement.cement_model import CementModel
@@ -41,6 +41,7 @@ class CementDataExporter(CommonDataExporter):
             self.visualize_extrapolation(model=model)
         self.stop_and_show()
 
+    @profiled
     def visualize_production(
         self, mfa: fd.MFASystem, production: fd.Flow, name: str, regional: bool = False
     ):
@@ -78,18 +79,22 @@ class CementDataExporter(CommonDataExporter):
             ap_production, f"{name}_production{regional_tag}.png", do_plot=False
         )
 
+    @profiled
     def visualize_clinker_production(self, mfa: fd.MFASystem):
         production = mfa.flows["clinker_production => cement_grinding"]
         self.visualize_production(production, "Clinker")
 
+    @profiled
     def visualize_cement_production(self, mfa: fd.MFASystem, regional: bool = False):
         production = mfa.flows["cement_grinding => concrete_production"]
         self.visualize_production(mfa=mfa, production=production, name="Cement", regional=regional)
 
+    @profiled
     def visualize_concrete_production(self, mfa: fd.MFASystem):
         production = mfa.flows["concrete_production => use"].sum_over("s")
         self.visualize_production(production, "Concrete")
 
+    @profiled
     def visualize_eol_stock(self, mfa: fd.MFASystem):
         over_gdp = self.cfg.eol_stock["over_gdp"]
         per_capita = self.cfg.eol_stock["per_capita"]
@@ -97,10 +102,12 @@ class CementDataExporter(CommonDataExporter):
 
         self.visualize_stock(mfa, stock, over_gdp, per_capita, "EOL")
 
+    @profiled
     def visualize_use_stock(self, mfa: fd.MFASystem, subplots_by_stock_type=False):
         subplot_dim = "Stock Type" if subplots_by_stock_type else None
         super().visualize_use_stock(mfa, stock=mfa.stocks["in_use"].stock, subplot_dim=subplot_dim)
 
+    @profiled
     def visualize_stock(self, mfa: fd.MFASystem, stock, over_gdp, per_capita, name):
         population = mfa.parameters["population"]
         x_array = None
@@ -123,6 +130,7 @@ class CementDataExporter(CommonDataExporter):
             stock, x_array, population, x_label, y_label, title, per_capita, over_gdp
         )
 
+    @profiled
     def visualize_global_stock(
         self, stock, x_array, population, x_label, y_label, title, per_capita, over_gdp
     ):
@@ -138,6 +146,7 @@ class CementDataExporter(CommonDataExporter):
         )
         # self.visualize_global_stock_by_region(stock, x_array, x_label, y_label, title, per_capita)
 
+    @profiled
     def visualize_global_stock_by_type(
         self, stock, x_array, population, x_label, y_label, title, per_capita
     ):
@@ -159,6 +168,7 @@ class CementDataExporter(CommonDataExporter):
 
         self.plot_and_save_figure(ap_stock, "use_stocks_global_by_type.png")
 
+    @profiled
     def visualize_extrapolation(self, model: "CementModel"):
         mfa = model.future_mfa
         per_capita = True  # TODO see where this shold go
@@ -2,10 +2,14 @@ import numpy as np
 import flodym as fd
 
 from remind_mfa.common.assumptions_doc import add_assumption_doc
+from remind_mfa.common.common_mfa_system import ParameterDict
+from remind_mfa.common.profiling import profile_stage
 
 
 class StockDrivenCementMFASystem(fd.MFASystem):
 
+    parameters: ParameterDict
+
     def compute(self, stock_projection: fd.FlodymArray):
         """
         Perform all computations for the MFA system.
@@ -13,7 +17,8 @@ class StockDrivenCementMFASystem(fd.MFASystem):
         self.compute_in_use_stock(stock_projection)
         self.compute_flows()
         self.compute_other_stocks()
-        self.check_mass_balance()
+        with profile_stage("check_mass_balance"):
+            self.check_mass_balance()
         self.check_flows(raise_error=False)
 
     def compute_in_use_stock(self, stock_projection: fd.FlodymArray):
@@ -1,17 +1,22 @@
 import flodym as fd
 
 from remind_mfa.common.assumptions_doc import add_assumption_doc
+from remind_mfa.common.common_mfa_system import ParameterDict
+from remind_mfa.common.profiling import profile_stage
 
 
 class InflowDrivenHistoricCementMFASystem(fd.MFASystem):
 
+    parameters: ParameterDict
+
     def compute(self):
         """
         Perform all computations for the MFA system.
         """
         self.compute_in_use_stock()
         self.compute_flows()
-        self.check_mass_balance()
+        with profile_stage("check_mass_balance"):
+            self.check_mass_balance()
         self.check_flows()
 
     def compute_in_use_stock(self):
@@ -12,6 +12,7 @@ from remind_mfa.cement.cement_data_reader import CementDataReader
 from remind_mfa.cement.cement_export import CementDataExporter
 from remind_mfa.common.stock_extrapolation import StockExtrapolation
 from remind_mfa.common.assumptions_doc import add_assumption_doc
+from remind_mfa.common.profiling import profile_stage, profiled
 
 
 class CementModel:
@@ -19,33 +20,88 @@ class CementModel:
     def __init__(self, cfg: GeneralCfg):
         self.cfg = cfg
         self.definition = get_definition(self.cfg)
-        self.data_reader = CementDataReader(
-            input_data_path=self.cfg.input_data_path, definition=self.definition
-        )
+        self.data_reader = self.make_data_reader(self.cfg, self.definition)
         self.data_writer = CementDataExporter(
             cfg=self.cfg.visualization,
             do_export=self.cfg.do_export,
             output_path=self.cfg.output_path,
         )
-        self.dims = self.data_reader.read_dimensions(self.definition.dimensions)
-        self.parameters = self.data_reader.read_parameters(
-            self.definition.parameters, dims=self.dims
-        )
+        with profile_stage("read_data"):
+            self.dims = self.data_reader.read_dimensions(self.definition.dimensions)
+            self.parameters = self.data_reader.read_parameters(
+                self.definition.parameters, dims=self.dims
+            )
         self.processes = fd.make_processes(self.definition.processes)
 
+    @staticmethod
+    def make_data_reader(cfg: GeneralCfg, definition: fd.MFADefinition) -> CementDataReader:
+        return CementDataReader(
+            input_data_path=cfg.input_data_path,
+            definition=definition,
+            cfg=cfg.data_reading,
+        )
+
+    @classmethod
+    def publish_input_data(cls, cfg: GeneralCfg):
+        """Reads the input data into the data cache, without building the model."""
+        definition = get_definition(cfg)
+        cls.make_data_reader(cfg, definition).publish(definition)
+
     def run(self):
+        """
+        Runs the model in stages, each of which is loaded from a checkpoint if one exists for its
+        inputs and config (see `CheckpointStore`).
+        """
+        customization = self.cfg.customization
+        checkpoints = self.cfg.checkpoints
+        key = checkpoints.data_key(self.dims, self.parameters)
+
         # historic mfa
-        self.historic_mfa = self.make_historic_mfa()
-        self.historic_mfa.compute()
+        self.historic_mfa, key = checkpoints.run_stage(
+            "historic_mfa",
+            self.compute_historic_mfa,
+            key,
+            {"lifetime_model_name": customization.lifetime_model_name},
+        )
 
         # future mfa
-        self.future_mfa = self.make_future_mfa()
-        future_stock = self.get_long_term_stock()
-        self.future_mfa.compute(future_stock)
+        (future_stock, self.stock_handler), key = checkpoints.run_stage(
+            "stock_projection",
+            lambda: (self.get_long_term_stock(), self.stock_handler),
+            key,
+            {
+                "stock_extrapolation_class_name": customization.stock_extrapolation_class_name,
+                "regression_mode": customization.regression_mode,
+            },
+        )
+        self.future_mfa, key = checkpoints.run_stage(
+            "future_mfa",
+            lambda: self.compute_future_mfa(future_stock),
+            key,
+            {"lifetime_model_name": customization.lifetime_model_name},
+        )
+
+        # visualization and export, export files and saved figures are written in the background
+        with profile_stage("export"):
+            export = self.data_writer.export_mfa(mfa=self.future_mfa)
+        with profile_stage("visualize"):
+            self.data_writer.visualize_results(model=self)
+        with profile_stage("write_export"):
+            export.result()
+        with profile_stage("render_figures"):
+            self.data_writer.wait_for_figures()
+
+    @profiled
+    def compute_historic_mfa(self) -> InflowDrivenHistoricCementMFASystem:
+        historic_mfa = self.make_historic_mfa()
+        historic_mfa.compute()
+        return historic_mfa
 
-        # visualization and export
-        self.data_writer.export_mfa(mfa=self.future_mfa)
-        self.data_writer.visualize_results(model=self)
+    @profiled
+    def compute_future_mfa(self, future_stock: fd.FlodymArray) -> StockDrivenCementMFASystem:
+        future_mfa = self.make_future_mfa()
+        future_mfa.compute(future_stock)
+        return future_mfa
 
     def make_historic_mfa(self) -> InflowDrivenHistoricCementMFASystem:
         historic_dim_letters = tuple([d for d in self.dims.letters if d != "t"])
@@ -74,6 +130,7 @@ class CementModel:
             stocks=stocks,
         )
 
+    @profiled
     def get_long_term_stock(self) -> fd.FlodymArray:
         # extrapolate in use stock to future
         indep_fit_dim_letters = ("r",)
@@ -99,6 +156,9 @@ class CementModel:
             target_dim_letters=("t", "r"),
             indep_fit_dim_letters=indep_fit_dim_letters,
             bound_list=bound_list,
+            regression_mode=self.cfg.customization.regression_mode,
+            n_workers=self.cfg.customization.n_regression_workers,
+            fit_cache=self.cfg.customization.fit_cache,
         )
         add_assumption_doc(
             type="ad-hoc fix",
@@ -1,3 +1,4 @@
+from contextvars import ContextVar
 from inspect import stack, getframeinfo
 from pydantic import field_validator
 from typing import ClassVar, Any, Optional
@@ -5,15 +6,21 @@ import os
 
 from remind_mfa.common.base_model import RemindMFABaseModel
 
+# one list per context, such that models run concurrently in threads keep separate lists
+_assumptions: ContextVar[list] = ContextVar("assumptions")
 
-_assumptions = []
+
+def get_assumptions() -> list:
+    if _assumptions.get(None) is None:
+        _assumptions.set([])
+    return _assumptions.get()
 
 
 def add_assumption_doc(
     type: str, name: str, description: str, value: str = None, source: str = None
 ):
     """
-    Add an assumption to the list of assumptions. The assumption is stored in a global list
+    Add an assumption to the list of assumptions. The assumption is stored in a list per context
     and can be printed later using the print_assumptions() function.
     Args:
         type (str): The type of the assumption. Must be one of the allowed types:
@@ -34,7 +41,7 @@ def add_assumption_doc(
         line_number=caller.lineno,
         source=source,
     )
-    _assumptions.append(assumption)
+    get_assumptions().append(assumption)
 
 
 class Assumption(RemindMFABaseModel):
@@ -76,4 +83,4 @@ class Assumption(RemindMFABaseModel):
 
 
 def assumptions_str() -> str:
-    return "\n".join(str(a) for a in _assumptions)
+    return "\n".join(str(a) for a in get_assumptions())
@@ -0,0 +1,113 @@
+import functools
+import hashlib
+import importlib.metadata
+import json
+import logging
+import os
+import pickle
+import flodym as fd
+from collections.abc import Mapping
+from typing import Any, Callable, Optional, Tuple
+
+from remind_mfa.common.base_model import RemindMFABaseModel
+from remind_mfa.common.assumptions_doc import get_assumptions
+from remind_mfa.common.file_export import atomic_write
+from remind_mfa.common.fit_cache import hash_arrays
+
+
+@functools.lru_cache(maxsize=None)
+def code_version() -> str:
+    """
+    Hash of the source files of the remind_mfa package and the version of flodym, which also
+    changes with uncommitted edits. The source files are read once per process.
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    h = hashlib.sha256()
+    try:
+        h.update(importlib.metadata.version("flodym").encode())
+    except importlib.metadata.PackageNotFoundError:
+        pass
+    for directory, subdirectories, files in os.walk(package_dir):
+        subdirectories.sort()
+        for file in sorted(files):
+            if not file.endswith(".py"):
+                continue
+            path = os.path.join(directory, file)
+            h.update(os.path.relpath(path, package_dir).encode())
+            with open(path, "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+
+class CheckpointStore(RemindMFABaseModel):
+    """
+    On-disk store of the results of model stages, such as the historic MFA or the stock projection.
+    Each checkpoint is keyed by a hash of the stage name, the relevant config values and the key of
+    the stage it depends on, the first of which is keyed by the input data. If anything upstream of
+    a stage changes, the stage and all stages after it get new keys and are recomputed.
+    Assumptions documented while computing a stage are stored with its result, and added again
+    when the checkpoint is loaded.
+    The first key also covers the model code, see `code_version`, so that all stages are
+    recomputed after code changes.
+    If `checkpoint_dir` is None, stages are always computed.
+    """
+
+    checkpoint_dir: Optional[str] = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.checkpoint_dir is not None
+
+    def data_key(self, dims: fd.DimensionSet, parameters: dict[str, fd.Parameter]) -> str:
+        """Hash of the input data, i.e. dimension items and parameter values, and the code."""
+        if not self.is_active:
+            return ""
+        h = hashlib.sha256()
+        h.update(code_version().encode())
+        h.update(str([(dim.letter, dim.items) for dim in dims.dim_list]).encode())
+        for name in sorted(parameters):
+            h.update(name.encode())
+            h.update(str(parameters[name].dims.letters).encode())
+            h.update(hash_arrays(parameters[name].values).encode())
+        return h.hexdigest()
+
+    @staticmethod
+    def stage_key(stage: str, parent_key: str, config: dict) -> str:
+        content = json.dumps([stage, parent_key, config], sort_keys=True, default=str)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def checkpoint_file(self, stage: str, key: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"{stage}_{key[:32]}.pickle")
+
+    def run_stage(
+        self,
+        stage: str,
+        compute: Callable[[], Any],
+        parent_key: str,
+        config: Optional[dict] = None,
+    ) -> Tuple[Any, str]:
+        """Returns the result of the stage, loaded or computed, and its key."""
+        if not self.is_active:
+            return compute(), ""
+        key = self.stage_key(stage, parent_key, config if config is not None else {})
+        path = self.checkpoint_file(stage, key)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                result, assumptions = pickle.load(f)
+            get_assumptions().extend(assumptions)
+            logging.info(f"Loaded stage {stage} from checkpoint {path}.")
+            return result, key
+
+        n_assumptions = len(get_assumptions())
+        result = compute()
+        assumptions = get_assumptions()[n_assumptions:]
+        # mappings such as lazily read parameters are read completely only to be stored
+        if isinstance(result, Mapping):
+            result = dict(result)
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        try:
+            with atomic_write(path, "wb") as f:
+                pickle.dump((result, assumptions), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as error:
+            logging.warning(f"Could not store checkpoint of stage {stage}: {error}")
+        return result, key
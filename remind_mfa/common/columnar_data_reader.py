@@ -0,0 +1,144 @@
+import os
+import numpy as np
+import pandas as pd
+import flodym as fd
+from typing import Optional
+
+COLUMNAR_EXTENSIONS = (".parquet", ".arrow", ".feather")
+
+
+def find_columnar_file(csv_path: str) -> Optional[str]:
+    """Returns a Parquet or Arrow IPC file next to the given CSV file with the same name, if any."""
+    stem = os.path.splitext(csv_path)[0]
+    for extension in COLUMNAR_EXTENSIONS:
+        if os.path.isfile(stem + extension):
+            return stem + extension
+    return None
+
+
+def read_columnar_file(path: str) -> pd.DataFrame:
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_feather(path)
+
+
+def item_codes(column: pd.Series, dim: fd.Dimension) -> np.ndarray:
+    """Index of each entry in the items of the dimension, -1 for entries that are not items."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # dictionary-encoded columns: only convert the categories
+        categories = column.cat.categories
+        if dim.dtype is str:
+            categories = categories.astype(str).str.strip()
+        elif dim.dtype is not None:
+            categories = categories.astype(dim.dtype)
+        codes = pd.Categorical(categories, categories=dim.items).codes
+        return np.where(column.cat.codes >= 0, codes[column.cat.codes], -1)
+    if dim.dtype is str:
+        column = column.astype(str).str.strip()
+    elif dim.dtype is not None:
+        column = column.astype(dim.dtype)
+    return pd.Categorical(column, categories=dim.items).codes
+
+
+def df_to_values(
+    df: pd.DataFrame,
+    dims: fd.DimensionSet,
+    allow_missing_values: bool = False,
+    allow_extra_values: bool = False,
+) -> np.ndarray:
+    """
+    Converts a data frame in long format, with one column per dimension (named by dimension name or
+    letter) and a single value column, to an array of shape `dims.shape`.
+    Dimensions with a single item may be omitted. Missing and extra values are handled as in
+    `fd.FlodymArray.from_df`.
+    """
+    df = df.rename(columns={dim.letter: dim.name for dim in dims.dim_list})
+    value_columns = [c for c in df.columns if c not in dims.names]
+    if len(value_columns) != 1:
+        raise ValueError(
+            f"Expected exactly one value column besides the dimension columns, found {value_columns}."
+        )
+    values_in = df[value_columns[0]].to_numpy(dtype=np.float64)
+
+    if dims.ndim == 0:
+        if len(values_in) == 0 and allow_missing_values:
+            return np.array(0.0)
+        if len(values_in) != 1:
+            raise ValueError(f"Expected exactly one row for a scalar, found {len(values_in)}.")
+        return np.array(values_in[0])
+
+    codes = []
+    for dim in dims.dim_list:
+        if dim.name in df.columns:
+            codes.append(item_codes(df[dim.name], dim))
+        elif dim.len == 1:
+            codes.append(np.zeros(len(df), dtype=np.int64))
+        else:
+            raise ValueError(f"Dimension {dim.name} has more than one item, but no column.")
+    codes = np.array(codes, dtype=np.int64).reshape(dims.ndim, len(df))
+
+    extra = np.any(codes < 0, axis=0)
+    if np.any(extra):
+        if not allow_extra_values:
+            extra_items = {
+                dim.name: sorted(set(df[dim.name][codes[i] < 0].astype(str)))
+                for i, dim in enumerate(dims.dim_list)
+                if np.any(codes[i] < 0)
+            }
+            raise ValueError(f"Items not in the dimensions: {extra_items}")
+        codes = codes[:, ~extra]
+        values_in = values_in[~extra]
+
+    flat_index = np.ravel_multi_index(tuple(codes), dims.shape)
+    if len(np.unique(flat_index)) != len(flat_index):
+        raise ValueError("Some index combinations occur more than once in the data.")
+    nan = np.isnan(values_in)
+    if allow_missing_values:
+        values_in = np.where(nan, 0.0, values_in)
+    elif len(flat_index) != np.prod(dims.shape) or np.any(nan):
+        raise ValueError(
+            f"Expected {np.prod(dims.shape)} values, but got {len(flat_index)} rows with "
+            f"{np.count_nonzero(nan)} empty values, while missing values are not allowed."
+        )
+
+    values = np.zeros(dims.shape)
+    values.flat[flat_index] = values_in
+    return values
+
+
+class ColumnarDimensionReader(fd.DimensionReader):
+    """
+    Reads dimension items from single-column Parquet or Arrow IPC files next to the CSV files.
+    Dimensions without such a file are read by the given CSV reader.
+    """
+
+    def __init__(self, csv_reader: fd.CSVDimensionReader):
+        self.csv_reader = csv_reader
+
+    def read_dimension(self, definition: fd.DimensionDefinition) -> fd.Dimension:
+        path = find_columnar_file(self.csv_reader.dimension_files[definition.name])
+        if path is None:
+            return self.csv_reader.read_dimension(definition)
+        return fd.Dimension.from_np(read_columnar_file(path).iloc[:, 0].to_numpy(), definition)
+
+
+class ColumnarParameterReader(fd.ParameterReader):
+    """
+    Reads parameters from Parquet or Arrow IPC files next to the CSV files, in the long format
+    described in `df_to_values`. Parameters without such a file are read by the given CSV reader.
+    """
+
+    def __init__(self, csv_reader: fd.CSVParameterReader):
+        self.csv_reader = csv_reader
+
+    def read_parameter_values(self, parameter_name: str, dims: fd.DimensionSet) -> fd.Parameter:
+        path = find_columnar_file(self.csv_reader.parameter_filenames[parameter_name])
+        if path is None:
+            return self.csv_reader.read_parameter_values(parameter_name, dims)
+        values = df_to_values(
+            read_columnar_file(path),
+            dims,
+            allow_missing_values=self.csv_reader.allow_missing_values,
+            allow_extra_values=self.csv_reader.allow_extra_values,
+        )
+        return fd.Parameter(dims=dims, values=values, name=parameter_name)
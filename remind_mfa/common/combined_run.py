@@ -0,0 +1,109 @@
+import contextvars
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from copy import deepcopy
+from typing import Any, Callable, List, Literal, Optional
+
+from remind_mfa.common.base_model import RemindMFABaseModel
+from remind_mfa.common.custom_data_reader import SharedInputData
+from remind_mfa.common.sweep import log_filled_keys, set_nested, share_input_data
+
+
+class CombinedRunCfg(RemindMFABaseModel):
+
+    configs: List[dict]
+    """Run configs of the material models, in the format of a single run config."""
+    output_path: str
+    """Run directory. Each model exports to a subdirectory named by its model class."""
+    parallel: Literal["threads", "processes"] = "threads"
+    """
+    With threads, equal input data is read once and shared by all models, which run concurrently
+    where NumPy releases the GIL. With processes, input data is published to a shared data cache
+    beforehand, which the processes attach to as memory maps.
+    """
+    n_workers: Optional[int] = None
+    """Number of threads or processes. Defaults to the number of models."""
+
+
+def model_configs(cfg: CombinedRunCfg) -> List[dict]:
+    configs = []
+    filled_keys = set()
+    names = [config["model_class"] for config in cfg.configs]
+    for i, config in enumerate(cfg.configs):
+        config = deepcopy(config)
+        name = names[i] if names.count(names[i]) == 1 else f"{names[i]}_{i}"
+        config["output_path"] = os.path.join(cfg.output_path, name)
+        # figures can not be shown from worker threads or processes
+        set_nested(config, "visualization.do_show_figs", False)
+        if cfg.parallel == "processes":
+            filled_keys.update(share_input_data(config, os.path.join(cfg.output_path, "cache")))
+        configs.append(config)
+    log_filled_keys(filled_keys)
+    return configs
+
+
+def timed(run: Callable, *args) -> float:
+    start = time.perf_counter()
+    run(*args)
+    return time.perf_counter() - start
+
+
+def run_in_new_context(run_model: Callable[[dict], Any], config: dict) -> float:
+    """Runs a model with its own assumption list, see `assumptions_doc`."""
+    return contextvars.Context().run(timed, run_model, config)
+
+
+def run_combined(
+    cfg: CombinedRunCfg,
+    run_model: Callable[[dict], Any],
+    publish_input_data: Callable[[dict], Any],
+):
+    """
+    Runs several material models concurrently with `run_model`, which takes a config dictionary,
+    in threads or processes alike.
+    `publish_input_data` takes a config dictionary and reads its input data without building the
+    model. With processes, it is called for every model in the main process beforehand.
+    A summary with the status and wall time of each model is written to `run.json` in the run
+    directory. If any model fails, an error is raised after all models have finished.
+    """
+    os.makedirs(cfg.output_path, exist_ok=True)
+    configs = model_configs(cfg)
+    names = [os.path.basename(config["output_path"]) for config in configs]
+    n_workers = cfg.n_workers if cfg.n_workers is not None else len(configs)
+
+    start = time.perf_counter()
+    if cfg.parallel == "threads":
+        with SharedInputData(), ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(run_in_new_context, run_model, config) for config in configs]
+    else:
+        for config in configs:
+            try:
+                publish_input_data(config)
+            except Exception:
+                # the error is reported when the model is run
+                pass
+        logging.info(f"Input data published in {time.perf_counter() - start:.1f} s.")
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(run_in_new_context, run_model, config) for config in configs]
+
+    summary = {"wall_time": time.perf_counter() - start, "models": {}}
+    errors = []
+    for name, future in zip(names, futures):
+        try:
+            summary["models"][name] = {"status": "completed", "wall_time": future.result()}
+        except Exception as error:
+            summary["models"][name] = {
+                "status": "failed",
+                "error": f"{type(error).__name__}: {error}",
+            }
+            errors.append(error)
+    with open(os.path.join(cfg.output_path, "run.json"), "w") as f:
+        json.dump(summary, f, indent=1)
+
+    if errors:
+        failed = [name for name, info in summary["models"].items() if info["status"] == "failed"]
+        raise RuntimeError(f"Models {failed} failed, see run.json.") from errors[0]
+    logging.info(f"All models completed in {summary['wall_time']:.1f} s.")
@@ -3,6 +3,8 @@ import flodym as fd
 from typing import Optional
 
 from .data_extrapolations import Extrapolation
+from .fit_cache import FitCache
+from .checkpoints import CheckpointStore
 
 
 IMPLEMENTED_MODELS = [
@@ -33,6 +35,12 @@ class ModelCustomization(RemindMFABaseModel):
     lifetime_model_name: str
     do_stock_extrapolation_by_category: bool = False
     mode: Optional[str] = None
+    regression_mode: str = "sequential"
+    n_regression_workers: Optional[int] = None
+    fit_cache_path: Optional[str] = None
+    trade_solver: str = "fixed_point"
+    global_saturation_level_factor: float = 0.75
+    scenario: Optional[str] = None
 
     @property
     def lifetime_model(self) -> fd.LifetimeModel:
@@ -43,12 +51,37 @@ class ModelCustomization(RemindMFABaseModel):
         """Check if the given extrapolation class is a valid subclass of OneDimensionalExtrapolation and return it."""
         return choose_subclass_by_name(self.stock_extrapolation_class_name, Extrapolation)
 
+    @property
+    def fit_cache(self) -> Optional[FitCache]:
+        """Cache of fitted extrapolation parameters, if a cache path is given."""
+        if self.fit_cache_path is None:
+            return None
+        return FitCache(cache_dir=self.fit_cache_path)
+
+
+class DataReadingCfg(RemindMFABaseModel):
+    cache_path: Optional[str] = None
+    n_threads: int = 1
+    lazy: bool = False
+    strict: bool = True
+    format: str = "csv"
+    shared_memory: bool = False
+
+
+class ProfilingCfg(RemindMFABaseModel):
+    enabled: bool = False
+    trace_allocations: bool = False
+    log_summary: bool = True
+
 
 class ExportCfg(RemindMFABaseModel):
     csv: bool = True
     pickle: bool = True
+    hdf5: bool = False
+    parquet: bool = False
     assumptions: bool = True
     future_input: bool = False
+    n_workers: int = 0
 
 
 class VisualizationCfg(RemindMFABaseModel):
@@ -61,6 +94,7 @@ class VisualizationCfg(RemindMFABaseModel):
     do_save_figs: bool = False
     plotting_engine: str = "plotly"
     plotly_renderer: str = "browser"
+    n_render_workers: int = 0
 
 
 class CementVisualizationCfg(VisualizationCfg):
@@ -89,10 +123,13 @@ class GeneralCfg(RemindMFABaseModel):
 
     model_class: str
     input_data_path: str
+    data_reading: DataReadingCfg = DataReadingCfg()
     customization: ModelCustomization
     visualization: VisualizationCfg
     output_path: str
+    checkpoint_path: Optional[str] = None
     do_export: ExportCfg
+    profiling: ProfilingCfg = ProfilingCfg()
 
     @classmethod
     def from_model_class(cls, **kwargs) -> "GeneralCfg":
@@ -109,6 +146,11 @@ class GeneralCfg(RemindMFABaseModel):
         subcls = subclasses[model_class]
         return subcls(**kwargs)
 
+    @property
+    def checkpoints(self) -> CheckpointStore:
+        """Store of stage results, which is inactive if no checkpoint path is given."""
+        return CheckpointStore(checkpoint_dir=self.checkpoint_path)
+
 
 class PlasticsCfg(GeneralCfg):
 
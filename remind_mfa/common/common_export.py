@@ -1,41 +1,96 @@
 import os
-from matplotlib import pyplot as plt
-import plotly.graph_objects as go
-import plotly.colors as plc
-import plotly.io as pio
-from typing import Optional
-from pydantic import model_validator
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Optional
 import flodym as fd
-import flodym.export as fde
 
 from remind_mfa.common.base_model import RemindMFABaseModel
 from remind_mfa.common.common_cfg import VisualizationCfg, ExportCfg
 from remind_mfa.common.assumptions_doc import assumptions_str
+from remind_mfa.common.data_export import (
+    export_mfa_flows_to_csv,
+    export_mfa_stocks_to_csv,
+    export_mfa_to_hdf5,
+    export_mfa_to_parquet,
+    export_mfa_to_pickle,
+    write_text_file,
+)
+from remind_mfa.common.figure_rendering import FigureRenderQueue
+from remind_mfa.common.file_export import FileExportQueue
+from remind_mfa.common.profiling import profiled
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+    import flodym.export as fde
 
 
 class CommonDataExporter(RemindMFABaseModel):
+    """
+    Exports and visualizes the results of a model.
+    The plotting libraries (matplotlib, plotly and `flodym.export`) are only imported once a figure
+    is made, such that runs without visualization do not spend time loading them.
+    Saved figures are written by a `FigureRenderQueue`, which has to be waited for with
+    `wait_for_figures` after visualizing.
+    Export files are written by a `FileExportQueue`, and `export_mfa` returns a future for them,
+    such that they can be written during the visualization.
+    """
+
     output_path: str
     do_export: ExportCfg
     cfg: VisualizationCfg
     _display_names: dict = {}
+    _render_queue: Optional[FigureRenderQueue] = None
+    _export_queue: Optional[FileExportQueue] = None
+
+    @property
+    def render_queue(self) -> FigureRenderQueue:
+        if self._render_queue is None:
+            self._render_queue = FigureRenderQueue(n_workers=self.cfg.n_render_workers)
+        return self._render_queue
+
+    def wait_for_figures(self):
+        if self._render_queue is not None:
+            self._render_queue.wait()
+
+    @property
+    def export_queue(self) -> FileExportQueue:
+        if self._export_queue is None:
+            self._export_queue = FileExportQueue(n_workers=self.do_export.n_workers)
+        return self._export_queue
 
-    @model_validator(mode="after")
     def set_plotly_renderer(self):
-        if self.cfg.plotting_engine == "plotly":
-            pio.renderers.default = self.cfg.plotly_renderer
-        return self
+        import plotly.io as pio
 
-    def export_mfa(self, mfa: fd.MFASystem):
+        pio.renderers.default = self.cfg.plotly_renderer
+
+    def export_mfa(self, mfa: fd.MFASystem) -> Future:
+        """
+        Starts writing the export files and returns a future which is done once all are written.
+        Its `result` raises an error naming the files that could not be written.
+        The MFA system must not be changed until then.
+        """
+        os.makedirs(self.export_path(), exist_ok=True)
+        self.submit_export_files(mfa)
+        return self.export_queue.as_future()
+
+    def submit_export_files(self, mfa: fd.MFASystem):
+        queue = self.export_queue
         if self.do_export.pickle:
-            fde.export_mfa_to_pickle(mfa=mfa, export_path=self.export_path("mfa.pickle"))
+            path = self.export_path("mfa.pickle")
+            queue.submit(path, export_mfa_to_pickle, mfa=mfa, export_path=path)
         if self.do_export.csv:
             dir_out = os.path.join(self.export_path(), "flows")
-            fde.export_mfa_flows_to_csv(mfa=mfa, export_directory=dir_out)
-            fde.export_mfa_stocks_to_csv(mfa=mfa, export_directory=dir_out)
+            export_mfa_flows_to_csv(mfa=mfa, export_directory=dir_out, queue=queue)
+            export_mfa_stocks_to_csv(mfa=mfa, export_directory=dir_out, queue=queue)
+        if self.do_export.hdf5:
+            path = self.export_path("mfa.h5")
+            queue.submit(path, export_mfa_to_hdf5, mfa=mfa, export_path=path)
+        if self.do_export.parquet:
+            dir_out = self.export_path("parquet")
+            export_mfa_to_parquet(mfa=mfa, export_directory=dir_out, queue=queue)
         if self.do_export.assumptions:
-            file_out = os.path.join(self.export_path("assumptions.txt"))
-            with open(file_out, "w") as f:
-                f.write(assumptions_str())
+            # the assumptions are recorded per run in a context variable, not seen by the threads
+            path = self.export_path("assumptions.txt")
+            queue.submit(path, write_text_file, path, assumptions_str())
 
     def export_path(self, filename: str = None):
         path_tuple = (self.output_path, "export")
@@ -46,13 +101,17 @@ class CommonDataExporter(RemindMFABaseModel):
     def figure_path(self, filename: str):
         return os.path.join(self.output_path, "figures", filename)
 
-    def _show_and_save_plotly(self, fig: go.Figure, name):
+    def _show_and_save_plotly(self, fig: "go.Figure", name):
         if self.cfg.do_save_figs:
-            fig.write_image(self.figure_path(f"{name}.png"))
+            self.render_queue.submit(fig, "plotly", self.figure_path(f"{name}.png"))
         if self.cfg.do_show_figs:
+            self.set_plotly_renderer()
             fig.show()
 
+    @profiled
     def visualize_sankey(self, mfa: fd.MFASystem):
+        import flodym.export as fde
+
         plotter = fde.PlotlySankeyPlotter(
             mfa=mfa, display_names=self._display_names, **self.cfg.sankey
         )
@@ -68,20 +127,34 @@ class CommonDataExporter(RemindMFABaseModel):
     def figure_path(self, filename: str) -> str:
         return os.path.join(self.output_path, "figures", filename)
 
-    def plot_and_save_figure(self, plotter: fde.ArrayPlotter, filename: str, do_plot: bool = True):
+    def plot_and_save_figure(
+        self, plotter: "fde.ArrayPlotter", filename: str, do_plot: bool = True
+    ):
         if do_plot:
             plotter.plot()
         if self.cfg.do_show_figs:
+            if self.cfg.plotting_engine == "plotly":
+                self.set_plotly_renderer()
             plotter.show()
         if self.cfg.do_save_figs:
-            plotter.save(self.figure_path(filename), width=2200, height=1300)
+            self.render_queue.submit(
+                plotter.fig,
+                self.cfg.plotting_engine,
+                self.figure_path(filename),
+                width=2200,
+                height=1300,
+            )
 
     def stop_and_show(self):
         if self.cfg.plotting_engine == "pyplot" and self.cfg.do_show_figs:
+            from matplotlib import pyplot as plt
+
             plt.show()
 
     @property
     def plotter_class(self):
+        import flodym.export as fde
+
         if self.cfg.plotting_engine == "plotly":
             return fde.PlotlyArrayPlotter
         elif self.cfg.plotting_engine == "pyplot":
@@ -166,6 +239,7 @@ class CommonDataExporter(RemindMFABaseModel):
         title: Optional[str] = None,
         **kwargs,
     ):
+        import plotly.colors as plc
 
         colors = plc.qualitative.Dark24
         if linecolor_dim:
@@ -1,12 +1,18 @@
 import flodym as fd
-from typing import Optional
+from typing import Dict, Optional
+from pydantic import SkipValidation
 
 from remind_mfa.common.trade import TradeSet
 
+ParameterDict = SkipValidation[Dict[str, fd.Parameter]]
+"""Parameters of an MFA system. They are not validated on construction, such that parameters in a
+`LazyParameters` mapping are only read when accessed."""
+
 
 class CommonMFASystem(fd.MFASystem):
 
     trade_set: TradeSet
+    parameters: ParameterDict
     mode: Optional[str] = None
 
     def fill_trade(self):
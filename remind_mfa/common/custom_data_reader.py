@@ -1,5 +1,165 @@
+import hashlib
 import os
+import threading
+from collections.abc import MutableMapping
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
 import flodym as fd
+from typing import Callable, Optional
+
+from remind_mfa.common.common_cfg import DataReadingCfg
+from remind_mfa.common.data_cache import DataCache, file_hash
+from remind_mfa.common.columnar_data_reader import (
+    ColumnarDimensionReader,
+    ColumnarParameterReader,
+    find_columnar_file,
+)
+
+
+def with_message(error: Exception, message: str) -> Exception:
+    """
+    Error of the same type with another message, such that callers can still catch it by type.
+    Falls back to a `ValueError` for types which do not take a single message argument.
+    """
+    try:
+        return type(error)(message)
+    except Exception:
+        return ValueError(message)
+
+
+class CachedCSVDimensionReader(fd.CSVDimensionReader):
+    """CSV dimension reader that stores the parsed items in a `DataCache`."""
+
+    def __init__(self, dimension_files: dict[str, str], cache: DataCache, **read_csv_kwargs):
+        super().__init__(dimension_files, **read_csv_kwargs)
+        self.cache = cache
+
+    def read_dimension(self, definition: fd.DimensionDefinition) -> fd.Dimension:
+        path = self.dimension_files[definition.name]
+        key = f"dimension/{definition.name}"
+        items = self.cache.load(key, path)
+        if items is not None:
+            return fd.Dimension.from_np(items, definition)
+        dimension = super().read_dimension(definition)
+        self.cache.store(key, path, np.array(dimension.items))
+        return dimension
+
+
+class CachedCSVParameterReader(fd.CSVParameterReader):
+    """
+    CSV parameter reader that stores the parsed values in a `DataCache`.
+    As the values depend on the dimension items they are read for, these are part of the key.
+    """
+
+    def __init__(self, parameter_files: dict[str, str], cache: DataCache, **kwargs):
+        super().__init__(parameter_files, **kwargs)
+        self.cache = cache
+
+    def cache_key(self, parameter_name: str, dims: fd.DimensionSet) -> str:
+        settings = (
+            [(dim.letter, dim.items) for dim in dims.dim_list],
+            self.allow_missing_values,
+            self.allow_extra_values,
+            sorted(self.read_csv_kwargs.items()),
+        )
+        settings_hash = hashlib.sha256(str(settings).encode()).hexdigest()[:16]
+        return f"parameter/{parameter_name}/{settings_hash}"
+
+    def read_parameter_values(self, parameter_name: str, dims: fd.DimensionSet) -> fd.Parameter:
+        path = self.parameter_filenames[parameter_name]
+        key = self.cache_key(parameter_name, dims)
+        values = self.cache.load(key, path)
+        if values is not None:
+            return fd.Parameter(dims=dims, values=values, name=parameter_name)
+        parameter = super().read_parameter_values(parameter_name, dims)
+        self.cache.store(key, path, parameter.values)
+        if self.cache.mmap_mode is not None:
+            # attach to the stored file rather than keeping the parsed copy
+            parameter.values = self.cache.load(key, path)
+        return parameter
+
+
+class LazyParameters(MutableMapping):
+    """
+    Mapping of parameter names to parameters, where each parameter is read on first access.
+    Parameters can be replaced or added like in a dictionary.
+    """
+
+    def __init__(
+        self,
+        data_reader: "CustomDataReader",
+        parameter_definitions: list[fd.ParameterDefinition],
+        dims: fd.DimensionSet,
+    ):
+        self.data_reader = data_reader
+        self.definitions = {definition.name: definition for definition in parameter_definitions}
+        self.dims = dims
+        self.loaded: dict[str, fd.Parameter] = {}
+
+    def __getitem__(self, name: str) -> fd.Parameter:
+        if name not in self.loaded:
+            if name not in self.definitions:
+                raise KeyError(name)
+            self.loaded[name] = self.data_reader.read_parameter_file(
+                self.definitions[name], self.dims
+            )
+        return self.loaded[name]
+
+    def __setitem__(self, name: str, parameter: fd.Parameter):
+        self.loaded[name] = parameter
+
+    def __delitem__(self, name: str):
+        if name not in self:
+            raise KeyError(name)
+        self.loaded.pop(name, None)
+        self.definitions.pop(name, None)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.loaded or name in self.definitions
+
+    def __iter__(self):
+        return iter(dict.fromkeys([*self.definitions, *self.loaded]))
+
+    def __len__(self) -> int:
+        return len(dict.fromkeys([*self.definitions, *self.loaded]))
+
+
+class SharedInputData:
+    """
+    Dimensions and parameters read by any `CustomDataReader` while this store is active (as a
+    context manager), keyed by file content and read settings. Models reading equal files, like
+    population and GDP per capita in the datasets of different materials, then share one copy.
+    Parameters are handed out as new objects with read-only views of the shared values.
+    """
+
+    active: Optional["SharedInputData"] = None
+
+    def __init__(self):
+        self.entries: dict[tuple, Future] = {}
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> "SharedInputData":
+        SharedInputData.active = self
+        return self
+
+    def __exit__(self, *exc_info):
+        SharedInputData.active = None
+
+    def get(self, key: tuple, read: Callable):
+        """Returns the entry, which is read once even if requested by several threads at once."""
+        with self.lock:
+            future = self.entries.get(key)
+            is_reader = future is None
+            if is_reader:
+                future = self.entries[key] = Future()
+        if is_reader:
+            try:
+                future.set_result(read())
+            except Exception as error:
+                with self.lock:
+                    del self.entries[key]
+                future.set_exception(error)
+        return future.result()
 
 
 class CustomDataReader(fd.CompoundDataReader):
@@ -14,8 +174,18 @@ class CustomDataReader(fd.CompoundDataReader):
         "Scenario": "scenarios",
     }
 
-    def __init__(self, input_data_path, definition: fd.MFADefinition):
+    def __init__(
+        self,
+        input_data_path,
+        definition: fd.MFADefinition,
+        cfg: Optional[DataReadingCfg] = None,
+        allow_missing_values: bool = False,
+        allow_extra_values: bool = True,
+    ):
         self.input_data_path = input_data_path
+        self.cfg = cfg if cfg is not None else DataReadingCfg()
+        self.allow_missing_values = allow_missing_values
+        self.allow_extra_values = allow_extra_values
 
         dimension_files = {}
         for dimension in definition.dimensions:
@@ -23,13 +193,143 @@ class CustomDataReader(fd.CompoundDataReader):
             dimension_files[dimension.name] = os.path.join(
                 self.input_data_path, "dimensions", f"{dimension_filename}.csv"
             )
-        dimension_reader = fd.CSVDimensionReader(dimension_files)
+        self.dimension_files = dimension_files
 
         parameter_files = {}
         for parameter in definition.parameters:
             parameter_files[parameter.name] = os.path.join(
                 self.input_data_path, "datasets", f"{parameter.name}.csv"
             )
-        parameter_reader = fd.CSVParameterReader(parameter_files, allow_extra_values=True)
+        self.parameter_files = parameter_files
+
+        parameter_kwargs = dict(
+            allow_missing_values=allow_missing_values, allow_extra_values=allow_extra_values
+        )
+        if self.cfg.cache_path is None:
+            dimension_reader = fd.CSVDimensionReader(dimension_files)
+            parameter_reader = fd.CSVParameterReader(parameter_files, **parameter_kwargs)
+        else:
+            # copy-on-write maps: parameters changed in place get private copies of changed pages
+            mmap_mode = "c" if self.cfg.shared_memory else None
+            cache = DataCache(cache_dir=self.cfg.cache_path, mmap_mode=mmap_mode)
+            dimension_reader = CachedCSVDimensionReader(dimension_files, cache=cache)
+            parameter_reader = CachedCSVParameterReader(
+                parameter_files, cache=cache, **parameter_kwargs
+            )
+        if self.cfg.shared_memory and self.cfg.cache_path is None:
+            raise ValueError("Shared memory parameters require a cache path.")
+        if self.cfg.format == "parquet":
+            dimension_reader = ColumnarDimensionReader(csv_reader=dimension_reader)
+            parameter_reader = ColumnarParameterReader(csv_reader=parameter_reader)
+        elif self.cfg.format != "csv":
+            raise ValueError(f"Unknown data format {self.cfg.format}.")
 
         super().__init__(dimension_reader=dimension_reader, parameter_reader=parameter_reader)
+
+    def read_dimension(self, definition: fd.DimensionDefinition) -> fd.Dimension:
+        shared = SharedInputData.active
+        if shared is None:
+            return super().read_dimension(definition)
+        path = self.data_file(self.dimension_files[definition.name])
+        key = ("dimension", file_hash(path), definition.name, definition.letter, definition.dtype)
+        return shared.get(key, lambda: super(CustomDataReader, self).read_dimension(definition))
+
+    def read_parameters(
+        self, parameter_definitions: list[fd.ParameterDefinition], dims: fd.DimensionSet
+    ) -> dict[str, fd.Parameter]:
+        """
+        Reads all parameters, concurrently with a pool of `cfg.n_threads` threads if more than one.
+        Parsing mostly happens in pandas' C code, which releases the GIL.
+        If several files could not be read by the threads, one error of the type of the first one
+        is raised, naming all of them.
+        If `cfg.lazy` is set, a `LazyParameters` mapping is returned instead, which reads each
+        parameter on first access. With `cfg.strict`, it is checked beforehand that all parameter
+        files exist.
+        """
+        if self.cfg.lazy:
+            if self.cfg.strict:
+                self.check_parameter_files(parameter_definitions)
+            return LazyParameters(self, parameter_definitions, dims)
+
+        if self.cfg.n_threads <= 1:
+            return {
+                definition.name: self.read_parameter_file(definition, dims)
+                for definition in parameter_definitions
+            }
+
+        with ThreadPoolExecutor(max_workers=self.cfg.n_threads) as executor:
+            futures = {
+                definition.name: executor.submit(self.read_parameter_file, definition, dims)
+                for definition in parameter_definitions
+            }
+        parameters = {}
+        errors = []
+        for name, future in futures.items():
+            try:
+                parameters[name] = future.result()
+            except Exception as error:
+                errors.append(error)
+        if len(errors) == 1:
+            raise errors[0]
+        if errors:
+            message = "\n".join(str(error) for error in errors)
+            message = f"Could not read {len(errors)} parameter file(s):\n{message}"
+            raise with_message(errors[0], message) from errors[0]
+        return parameters
+
+    def read_parameter_file(
+        self, definition: fd.ParameterDefinition, dims: fd.DimensionSet
+    ) -> fd.Parameter:
+        dims = dims.get_subset(definition.dim_letters)
+        try:
+            shared = SharedInputData.active
+            if shared is None:
+                return self.read_parameter_values(parameter_name=definition.name, dims=dims)
+            key = (
+                "parameter",
+                file_hash(self.parameter_file(definition.name)),
+                tuple((dim.letter, tuple(dim.items)) for dim in dims.dim_list),
+                self.allow_missing_values,
+                self.allow_extra_values,
+            )
+            parameter = shared.get(
+                key, lambda: self.read_parameter_values(parameter_name=definition.name, dims=dims)
+            )
+        except Exception as error:
+            path = self.parameter_file(definition.name)
+            message = f"Parameter {definition.name} could not be read from {path}: {error}"
+            raise with_message(error, message) from error
+        values = parameter.values.view()
+        values.flags.writeable = False
+        return fd.Parameter(dims=dims, values=values, name=definition.name)
+
+    def publish(self, definition: fd.MFADefinition):
+        """
+        Reads all dimensions and parameters of the definition, also if `cfg.lazy` is set, such
+        that they are stored in the data cache and in the active `SharedInputData`, if any.
+        """
+        dims = self.read_dimensions(definition.dimensions)
+        for parameter_definition in definition.parameters:
+            self.read_parameter_file(parameter_definition, dims)
+
+    def data_file(self, csv_path: str) -> str:
+        """File the data is read from: a Parquet or Arrow file if present, the CSV otherwise."""
+        if self.cfg.format == "parquet":
+            columnar_file = find_columnar_file(csv_path)
+            if columnar_file is not None:
+                return columnar_file
+        return csv_path
+
+    def parameter_file(self, name: str) -> str:
+        return self.data_file(self.parameter_files[name])
+
+    def check_parameter_files(self, parameter_definitions: list[fd.ParameterDefinition]):
+        missing = [
+            self.parameter_file(definition.name)
+            for definition in parameter_definitions
+            if not os.path.isfile(self.parameter_file(definition.name))
+        ]
+        if missing:
+            raise FileNotFoundError(
+                f"Missing {len(missing)} parameter file(s):\n" + "\n".join(missing)
+            )
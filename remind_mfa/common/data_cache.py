@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from typing import Optional
+from pydantic import PrivateAttr
+
+from remind_mfa.common.base_model import RemindMFABaseModel
+from remind_mfa.common.file_export import atomic_write
+
+
+def file_hash(path: str) -> str:
+    """Hash of the content of a file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class DataCache(RemindMFABaseModel):
+    """
+    On-disk cache of parsed input data, stored as .npy files next to a manifest.
+    For every entry, the manifest records the source file (path, modification time, size and
+    content hash) and the cache file.
+    If modification time and size of the source file are unchanged, the cache file is used without
+    reading the source. Otherwise, the entry is only used if the content hash is unchanged.
+    Cache file names are derived from the entry key and the source content hash, such that a cache
+    file never changes its content, and source files with equal content at different paths share
+    it.
+    With `mmap_mode` set, cached arrays are returned as memory maps of the cache files (see
+    `np.load`), such that processes reading the same entries share their memory.
+    """
+
+    cache_dir: str
+    mmap_mode: Optional[str] = None
+    _manifest: Optional[dict] = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.cache_dir, "manifest.json")
+
+    def read_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    @property
+    def manifest(self) -> dict:
+        if self._manifest is None:
+            self._manifest = self.read_manifest()
+        return self._manifest
+
+    @staticmethod
+    def manifest_key(key: str, source_path: str) -> str:
+        return f"{key}@{os.path.abspath(source_path)}"
+
+    def load(self, key: str, source_path: str) -> Optional[np.ndarray]:
+        """Returns the cached array, or None if there is no valid entry."""
+        with self._lock:
+            entry = self.manifest.get(self.manifest_key(key, source_path))
+        if entry is None:
+            return None
+        cache_file = os.path.join(self.cache_dir, entry["cache_file"])
+        if not os.path.exists(cache_file):
+            return None
+        stat = os.stat(source_path)
+        if (entry["mtime"], entry["size"]) != (stat.st_mtime_ns, stat.st_size):
+            if entry["size"] != stat.st_size or entry["hash"] != file_hash(source_path):
+                return None
+            # source was touched, but not changed
+            self.update_entry(
+                self.manifest_key(key, source_path), dict(entry, mtime=stat.st_mtime_ns)
+            )
+        return np.load(cache_file, mmap_mode=self.mmap_mode)
+
+    def store(self, key: str, source_path: str, array: np.ndarray):
+        stat = os.stat(source_path)
+        source_hash = file_hash(source_path)
+        cache_file = f"{hashlib.sha256((key + source_hash).encode()).hexdigest()[:32]}.npy"
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with atomic_write(os.path.join(self.cache_dir, cache_file), "wb") as f:
+            np.save(f, array)
+        entry = {
+            "source": os.path.abspath(source_path),
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": source_hash,
+            "cache_file": cache_file,
+        }
+        self.update_entry(self.manifest_key(key, source_path), entry)
+
+    def update_entry(self, key: str, entry: dict):
+        with self._lock:
+            self.manifest[key] = entry
+            # merge with entries written by other processes in the meantime
+            manifest = self.read_manifest()
+            manifest.update(self.manifest)
+            self._manifest = manifest
+            with atomic_write(self.manifest_path) as f:
+                json.dump(manifest, f, indent=1)
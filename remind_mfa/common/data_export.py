@@ -0,0 +1,257 @@
+"""
+Writers for the export of MFA systems to pickle, CSV, HDF5 and Parquet files.
+The pickle and CSV writers produce the same output as the ones in `flodym.export`, which can not
+be imported without also importing matplotlib and plotly, such that runs without visualization do
+not need to load the plotting libraries.
+`to_valid_file_name`, `mfa_to_dict` and the pickle and CSV writers mirror
+`flodym/export/helper.py` and `flodym/export/data_writer.py` of flodym 1.1.0. Compare them with
+these files when updating flodym.
+"""
+
+import logging
+import os
+import pickle
+import re
+import shutil
+import unicodedata
+from typing import Callable, Optional
+from urllib.parse import quote
+
+import flodym as fd
+import numpy as np
+
+from remind_mfa.common.file_export import FileExportQueue
+
+
+def to_valid_file_name(value: str) -> str:
+    """Lowercase ASCII with underscores, like `flodym.export.helper.to_valid_file_name`."""
+    value = str(value)
+    value = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
+    value = re.sub(r"[^\w\s-]", "", value.lower())
+    return re.sub(r"[-\s]", "_", value).strip("-_")
+
+
+def mfa_to_dict(mfa: fd.MFASystem) -> dict:
+    """
+    Dictionary of the MFA system with NumPy values, which is readable without flodym, like
+    `flodym.export.convert_to_dict`.
+    """
+    return {
+        "dimension_names": {d.letter: d.name for d in mfa.dims},
+        "dimension_items": {d.name: d.items for d in mfa.dims},
+        "processes": [p.name for p in mfa.processes.values()],
+        "flows": {n: f.values for n, f in mfa.flows.items()},
+        "flow_dimensions": {n: f.dims.letters for n, f in mfa.flows.items()},
+        "flow_processes": {
+            n: (f.from_process.name, f.to_process.name) for n, f in mfa.flows.items()
+        },
+        "stocks": {n: s.stock.values for n, s in mfa.stocks.items()},
+        "stock_dimensions": {n: s.stock.dims.letters for n, s in mfa.stocks.items()},
+        "stock_processes": {
+            n: s.process.name for n, s in mfa.stocks.items() if s.process is not None
+        },
+    }
+
+
+def write_file(queue: Optional[FileExportQueue], path: str, func: Callable, *args):
+    """Writes a file with `func` right away, or through the queue if given."""
+    if queue is None:
+        func(*args)
+    else:
+        queue.submit(path, func, *args)
+
+
+def write_array_to_csv(array: fd.FlodymArray, path: str):
+    array.to_df().to_csv(path)
+
+
+def write_text_file(path: str, text: str):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def export_mfa_to_pickle(mfa: fd.MFASystem, export_path: str):
+    os.makedirs(os.path.dirname(export_path), exist_ok=True)
+    with open(export_path, "wb") as f:
+        pickle.dump(mfa_to_dict(mfa), f)
+    logging.info(f"Data saved to {export_path}")
+
+
+def export_mfa_flows_to_csv(
+    mfa: fd.MFASystem, export_directory: str, queue: Optional[FileExportQueue] = None
+):
+    os.makedirs(export_directory, exist_ok=True)
+    for flow_name, flow in mfa.flows.items():
+        path_out = os.path.join(export_directory, f"{to_valid_file_name(flow_name)}.csv")
+        write_file(queue, path_out, write_array_to_csv, flow, path_out)
+    if queue is None:
+        logging.info(f"Data saved in directory {export_directory}")
+
+
+def export_mfa_stocks_to_csv(
+    mfa: fd.MFASystem, export_directory: str, queue: Optional[FileExportQueue] = None
+):
+    os.makedirs(export_directory, exist_ok=True)
+    for stock_name, stock in mfa.stocks.items():
+        path_out = os.path.join(export_directory, f"{to_valid_file_name(stock_name)}_stock.csv")
+        write_file(queue, path_out, write_array_to_csv, stock.stock, path_out)
+    if queue is None:
+        logging.info(f"Data saved in directory {export_directory}")
+
+
+HDF5_CHUNK_BYTES = 1_000_000
+
+
+def hdf5_chunks(dims: fd.DimensionSet, itemsize: int) -> tuple:
+    """
+    Chunks holding a single region and the full extent of all other dimensions, such that a
+    region or a time slice can be read without reading the whole array. The time dimension is
+    split if such a chunk would exceed `HDF5_CHUNK_BYTES`.
+    """
+    chunks = [1 if dim.letter == "r" else dim.len for dim in dims]
+    time_axes = [i for i, dim in enumerate(dims) if dim.letter in ("t", "h")]
+    for i in time_axes:
+        while np.prod(chunks) * itemsize > HDF5_CHUNK_BYTES and chunks[i] > 1:
+            chunks[i] = (chunks[i] + 1) // 2
+    return tuple(chunks)
+
+
+def hdf5_scale(file, dim: fd.Dimension, scales: dict):
+    """Dataset of the dimension items, created on first use, which arrays refer to."""
+    if dim.letter not in scales:
+        import h5py
+
+        items = np.array(dim.items)
+        if items.dtype.kind == "U":
+            items = items.astype(h5py.string_dtype())
+        scale = file.create_dataset(f"dimensions/{dim.letter}", data=items)
+        scale.make_scale(dim.name)
+        scales[dim.letter] = scale
+    return scales[dim.letter]
+
+
+def write_hdf5_array(group, name: str, array: fd.FlodymArray, scales: dict):
+    values = np.asarray(array.values)
+    if values.ndim == 0:
+        dataset = group.create_dataset(name, data=values)
+    else:
+        dataset = group.create_dataset(
+            name,
+            data=values,
+            chunks=hdf5_chunks(array.dims, values.itemsize),
+            compression="gzip",
+            compression_opts=4,
+            shuffle=True,
+        )
+    for i, dim in enumerate(array.dims):
+        dataset.dims[i].attach_scale(hdf5_scale(group.file, dim, scales))
+        dataset.dims[i].label = dim.name
+    dataset.attrs["dimension_letters"] = "".join(array.dims.letters)
+    return dataset
+
+
+def export_mfa_to_hdf5(mfa: fd.MFASystem, export_path: str):
+    """
+    Writes all flows, stocks (stock, inflow and outflow) and parameters to a single compressed
+    HDF5 file, in the groups `flows`, `stocks/<stock name>` and `parameters`. The dimension items
+    are stored in the group `dimensions` and attached to the arrays as dimension scales, which
+    tools like xarray read as coordinates. Arrays are chunked by region, see `hdf5_chunks`.
+    """
+    import h5py
+
+    os.makedirs(os.path.dirname(export_path), exist_ok=True)
+    with h5py.File(export_path, "w") as f:
+        scales = {}
+        for dim in mfa.dims:
+            hdf5_scale(f, dim, scales)
+
+        for name, flow in mfa.flows.items():
+            dataset = write_hdf5_array(f.require_group("flows"), name, flow, scales)
+            dataset.attrs["from_process"] = flow.from_process.name
+            dataset.attrs["to_process"] = flow.to_process.name
+
+        for name, stock in mfa.stocks.items():
+            group = f.require_group(f"stocks/{name}")
+            if stock.process is not None:
+                group.attrs["process"] = stock.process.name
+            for attribute in ("stock", "inflow", "outflow"):
+                write_hdf5_array(group, attribute, getattr(stock, attribute), scales)
+
+        # only parameters that have been read, in case they are read lazily
+        parameters = getattr(mfa.parameters, "loaded", mfa.parameters)
+        for name, parameter in parameters.items():
+            write_hdf5_array(f.require_group("parameters"), name, parameter, scales)
+    logging.info(f"Data saved to {export_path}")
+
+
+def long_format_table(values: np.ndarray, dims: list[fd.Dimension]):
+    """
+    Long-format table of an array with one column per dimension and a value column.
+    Dimension columns are dictionary encoded: the items are stored once, and each row holds an
+    index into them, computed from the array shape without creating an object per row.
+    """
+    import pyarrow as pa
+
+    columns = {}
+    for i, dim in enumerate(dims):
+        index_shape = [1] * values.ndim
+        index_shape[i] = values.shape[i]
+        indices = np.arange(values.shape[i], dtype=np.int32).reshape(index_shape)
+        columns[dim.name] = pa.DictionaryArray.from_arrays(
+            np.broadcast_to(indices, values.shape).ravel(), pa.array(dim.items)
+        )
+    columns["value"] = values.ravel()
+    return pa.table(columns)
+
+
+def write_parquet_dataset(array: fd.FlodymArray, directory: str):
+    """
+    Writes one file per region into hive-style partition directories. The files are written
+    directly from the region slices of the array, which is several times faster than
+    `pyarrow.dataset.write_dataset`, as that groups the rows by the partition columns first.
+    """
+    import pyarrow.parquet as pq
+
+    shutil.rmtree(directory, ignore_errors=True)
+    dims = list(array.dims)
+    values = np.asarray(array.values)
+    if "r" not in array.dims.letters:
+        os.makedirs(directory)
+        pq.write_table(long_format_table(values, dims), os.path.join(directory, "part-0.parquet"))
+        return
+
+    i_region = array.dims.letters.index("r")
+    region = dims.pop(i_region)
+    values = np.moveaxis(values, i_region, 0)
+    # the dimension columns are the same for all regions, only the values are replaced
+    table = long_format_table(values[0], dims)
+    i_value = table.schema.get_field_index("value")
+    for i, item in enumerate(region.items):
+        region_directory = os.path.join(directory, f"{region.name}={quote(str(item), safe='')}")
+        os.makedirs(region_directory)
+        region_table = table.set_column(i_value, "value", [np.ascontiguousarray(values[i]).ravel()])
+        pq.write_table(region_table, os.path.join(region_directory, "part-0.parquet"))
+
+
+def parquet_directory(export_directory: str, name: str) -> str:
+    return os.path.join(export_directory, f"name={quote(name, safe='')}")
+
+
+def export_mfa_to_parquet(
+    mfa: fd.MFASystem, export_directory: str, queue: Optional[FileExportQueue] = None
+):
+    """
+    Writes all flows and stocks to long-format Parquet datasets in the subdirectories `flows`
+    and `stocks` of the export directory, partitioned hive-style by name and region, e.g.
+    `flows/name=sysenv%20%3D%3E%20use/Region=EUR/part-0.parquet`. Arrays without a region
+    dimension are only partitioned by name. Single flows or regions can be read with filters, e.g.
+    `pd.read_parquet(path, filters=[("name", "=", "sysenv => use"), ("Region", "=", "EUR")])`.
+    """
+    for name, flow in mfa.flows.items():
+        directory = parquet_directory(os.path.join(export_directory, "flows"), name)
+        write_file(queue, directory, write_parquet_dataset, flow, directory)
+    for name, stock in mfa.stocks.items():
+        directory = parquet_directory(os.path.join(export_directory, "stocks"), name)
+        write_file(queue, directory, write_parquet_dataset, stock.stock, directory)
+    if queue is None:
+        logging.info(f"Data saved in directory {export_directory}")
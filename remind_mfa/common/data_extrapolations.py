@@ -1,6 +1,8 @@
 from abc import abstractmethod
-from typing import Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, ClassVar, Literal, Optional, Tuple
 import numpy as np
+import os
 import sys
 from pydantic import model_validator
 from scipy.optimize import least_squares
@@ -8,6 +10,111 @@ from pydantic import PrivateAttr
 
 from remind_mfa.common.base_model import RemindMFABaseModel
 from remind_mfa.common.data_transformations import BoundList
+from remind_mfa.common.fit_cache import FitCache
+from remind_mfa.common.profiling import profiled, record
+
+_worker_extrapolation: "Extrapolation" = None
+"""Extrapolation object of a worker process in regression_mode "parallel"."""
+
+
+def _init_regression_worker(extrapolation: "Extrapolation"):
+    global _worker_extrapolation
+    _worker_extrapolation = extrapolation
+
+
+def _regress_slice(args: tuple) -> tuple[np.ndarray, np.ndarray]:
+    return _worker_extrapolation.regress_common(*args)
+
+
+def batched_least_squares(
+    fun: callable,
+    x0: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+    jac: callable = None,
+    ftol: float = 1.0e-10,
+    xtol: float = 1.0e-10,
+    gtol: float = 1.0e-12,
+    max_iter: int = None,
+) -> np.ndarray:
+    """
+    Box-constrained Levenberg-Marquardt solver for many independent least squares problems that
+    share the same functional form.
+
+    Args:
+        fun (callable): Maps parameters of shape (n_prms, n_slices) to residuals of shape
+            (n_residuals, n_slices). Residuals of a slice may only depend on the parameters of
+            that slice.
+        x0 (np.ndarray): Initial parameters of shape (n_prms, n_slices).
+        lower (np.ndarray): Lower bounds, same shape as x0.
+        upper (np.ndarray): Upper bounds, same shape as x0.
+        jac (callable, optional): Maps parameters to the Jacobian of shape
+            (n_residuals, n_prms, n_slices). Defaults to None, i.e. forward finite differences,
+            which need n_prms + 1 evaluations of `fun` for all slices together.
+        ftol, xtol, gtol (float): Tolerances on relative cost decrease, relative step size and
+            gradient norm, checked per slice.
+        max_iter (int, optional): Maximum number of iterations. Defaults to 200 * n_prms.
+    Returns:
+        np.ndarray: Optimized parameters of shape (n_prms, n_slices).
+    """
+    n_prms, n_slices = x0.shape
+    if max_iter is None:
+        max_iter = 200 * n_prms
+
+    def finite_difference_jac(x, residuals):
+        jacobian = np.empty(residuals.shape[:1] + (n_prms, n_slices))
+        for k in range(n_prms):
+            step = np.sqrt(np.finfo(float).eps) * np.maximum(1.0, np.abs(x[k]))
+            step = np.where(x[k] + step > upper[k], -step, step)
+            x_step = x.copy()
+            x_step[k] += step
+            jacobian[:, k, :] = (fun(x_step) - residuals) / step
+        return jacobian
+
+    x = np.clip(x0, lower, upper)
+    residuals = fun(x)
+    cost = 0.5 * np.sum(residuals**2, axis=0)
+    damping = np.full(n_slices, 1.0e-2)
+    converged = np.zeros(n_slices, dtype=bool)
+    identity = np.eye(n_prms)
+
+    for _ in range(max_iter):
+        jacobian = jac(x) if jac is not None else finite_difference_jac(x, residuals)
+        jacobian = np.moveaxis(jacobian, -1, 0)  # (n_slices, n_residuals, n_prms)
+        jtj = np.einsum("sik,sil->skl", jacobian, jacobian)
+        gradient = np.einsum("sik,is->sk", jacobian, residuals)
+
+        # parameters at a bound with the gradient pointing outwards are kept fixed
+        active = ((x.T <= lower.T) & (gradient > 0)) | ((x.T >= upper.T) & (gradient < 0))
+        gradient[active] = 0.0
+        converged |= np.max(np.abs(gradient), axis=1) <= gtol
+
+        scaling = np.maximum(np.diagonal(jtj, axis1=1, axis2=2), np.finfo(float).tiny)
+        system = jtj + damping[:, None, None] * scaling[:, None, :] * identity
+        system[active[:, :, None] | active[:, None, :]] = 0.0
+        system += active[:, :, None] * identity
+        step = -np.linalg.solve(system, gradient[..., None])[..., 0].T
+
+        x_new = np.clip(x + step, lower, upper)
+        x_new[:, converged] = x[:, converged]
+        residuals_new = fun(x_new)
+        cost_new = 0.5 * np.sum(residuals_new**2, axis=0)
+
+        improved = (cost_new < cost) & ~converged
+        small_decrease = cost - cost_new <= ftol * cost
+        small_step = np.all(np.abs(x_new - x) <= xtol * (xtol + np.abs(x)), axis=0)
+        converged |= improved & (small_decrease | small_step)
+        converged |= ~improved & (damping > 1.0e16)
+
+        x[:, improved] = x_new[:, improved]
+        residuals[:, improved] = residuals_new[:, improved]
+        cost[improved] = cost_new[improved]
+        damping = np.where(improved, damping / 3.0, damping * 2.0)
+
+        if np.all(converged):
+            break
+
+    return x
 
 
 class Extrapolation(RemindMFABaseModel):
@@ -29,8 +136,27 @@ class Extrapolation(RemindMFABaseModel):
     """Indizes for dimensions across which to regress independently. Other dimensions are regressed commonly."""
     prm_names: list[str] = []
     """Names of the parameters to be fitted. Set in subclasses."""
+    regression_mode: Literal["sequential", "batched", "parallel"] = "sequential"
+    """How the slices along `independent_dims` are regressed. "sequential" calls the solver once
+    per slice, "batched" solves all slices at once with a vectorized solver (see
+    `batched_least_squares`), "parallel" distributes the per-slice solver calls to a process pool."""
+    n_workers: Optional[int] = None
+    """Number of worker processes for regression_mode "parallel". Defaults to the number of CPUs."""
+    chunk_size: Optional[int] = None
+    """Number of slices sent to a worker at once in regression_mode "parallel". Defaults to about
+    four chunks per worker."""
+    initial_prms: Optional[np.ndarray] = None
+    """Initial guess for the parameters with shape of `fit_prms`, e.g. from a previous fit.
+    Defaults to None, i.e. the heuristic of `initial_guess` is used."""
+    fit_cache: Optional[FitCache] = None
+    """On-disk cache of fitted parameters for exact reuse or as initial guess. Defaults to None."""
     _fit_prms: np.ndarray = PrivateAttr(default=None)
     """Optimized parameters after regression (set by calling regress())."""
+    jac: ClassVar[Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]]] = None
+    """Derivatives of `transformed_func` with respect to the parameters, as a function of the
+    transformed predictor values (see `transform_predictor`) and the parameters, stacked along a
+    new first axis of shape (n_prms, *x.shape). Can be implemented in subclasses as a static
+    method. Otherwise, the Jacobian is approximated by finite differences."""
 
     @model_validator(mode="after")
     def validate_data(self):
@@ -89,6 +215,23 @@ class Extrapolation(RemindMFABaseModel):
         """
         pass
 
+    @property
+    def has_jac(self) -> bool:
+        """Whether the subclass provides an analytic Jacobian."""
+        return getattr(type(self), "jac", None) is not None
+
+    @staticmethod
+    def transform_predictor(x: np.ndarray) -> np.ndarray:
+        """
+        Transformation applied to the predictor values once per fit, before `transformed_func` is
+        evaluated. Identity by default.
+        """
+        return x
+
+    def transformed_func(self, x: np.ndarray, prms: np.ndarray) -> np.ndarray:
+        """`func` expressed in terms of transformed predictor values."""
+        return self.func(x, prms)
+
     @abstractmethod
     def initial_guess(
         self, predictor_values: np.ndarray, data_to_extrapolate: np.ndarray
@@ -102,19 +245,70 @@ class Extrapolation(RemindMFABaseModel):
         data_to_extrapolate: np.ndarray,
         weights: np.ndarray,
     ) -> callable:
+        """Weighted residuals as function of the parameters. Expects transformed predictor values."""
 
         def fitting_function(prms: np.ndarray) -> np.ndarray:
-            f = self.func(predictor_values, prms)
+            f = self.transformed_func(predictor_values, prms)
             loss = weights * (f - data_to_extrapolate)
             return loss.flatten()
 
         return fitting_function
 
+    def get_jacobian_function(self, predictor_values: np.ndarray, weights: np.ndarray) -> callable:
+        """Jacobian of the fitting function, shape (n_residuals, n_prms). Expects transformed predictor values."""
+
+        def jacobian_function(prms: np.ndarray) -> np.ndarray:
+            jacobian = weights * self.jac(predictor_values, prms)
+            return jacobian.reshape(self.n_prms, -1).T
+
+        return jacobian_function
+
+    @profiled
     def regress(self):
         """
         Fits the data to the predictor values using regression and returns the extrapolated values.
         The regression is performed independently for each dimension specified in `independent_dims`.
         """
+        initial_prms = self.initial_prms
+        if self.fit_cache is not None:
+            cached_prms, exact_hit = self.fit_cache.lookup(self)
+            if exact_hit:
+                self._fit_prms = cached_prms
+                return self.predict()
+            if cached_prms is not None and initial_prms is None:
+                self.initial_prms = cached_prms
+
+        try:
+            if self.regression_mode == "batched":
+                regression = self.regress_batched()
+            else:
+                regression = self.regress_slices()
+        finally:
+            # the warm start is not part of the cache key, see `FitCache.data_hash`
+            self.initial_prms = initial_prms
+
+        if self.fit_cache is not None:
+            self.fit_cache.store(self)
+        return regression
+
+    def predict(self, predictor_values: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Evaluates the functional form with the fitted parameters.
+        Args:
+            predictor_values (np.ndarray, optional): Predictor values to evaluate. Must have the
+                shape of the `predictor_values` used for the fit, but may have additional trailing
+                axes (e.g. scenarios), over which the fitted parameters are broadcast.
+                Defaults to None, i.e. the predictor values used for the fit.
+        """
+        if predictor_values is None:
+            predictor_values = self.predictor_values
+        extra_shape = predictor_values.shape[self.predictor_values.ndim :]
+        predictor = self.transform_predictor(self.to_batched(predictor_values))
+        fit_prms = self._fit_prms.reshape(-1, self.n_prms).T
+        return self.from_batched(self.transformed_func(predictor, fit_prms), extra_shape)
+
+    def regress_slices(self):
+        """Calls the solver once for each slice along `independent_dims`."""
         # extract dimensions that are regressed independently
         predictor_shape = tuple(
             [self.predictor_values.shape[i] for i in sorted(self.independent_dims)]
@@ -123,41 +317,173 @@ class Extrapolation(RemindMFABaseModel):
         self._fit_prms = np.zeros(predictor_shape + (self.n_prms,))
         bounds_array = self.bound_list.to_np_array(self.prm_names)
 
-        # loop over dimensions that are regressed independently
+        # collect slices of dimensions that are regressed independently
+        slices = []
         for slice_indep in np.ndindex(predictor_shape):
 
             slice_all = [slice(None)] * len(self.predictor_values.shape)
             for i, j in enumerate(self.independent_dims):
                 slice_all[j] = slice_indep[i]
-            slice_all = tuple(slice_all)
+            slices.append((slice_indep, tuple(slice_all)))
 
-            self._fit_prms[slice_indep], regression[slice_all] = self.regress_common(
+        slice_args = [
+            (
                 self.predictor_values[slice_all],
                 self.data_to_extrapolate[slice_all],
                 self.weights[slice_all],
                 bounds_array[slice_indep] if bounds_array is not None else (-np.inf, np.inf),
+                self.initial_prms[slice_indep] if self.initial_prms is not None else None,
             )
+            for slice_indep, slice_all in slices
+        ]
+        if self.regression_mode == "parallel":
+            results = self.regress_parallel(slice_args)
+        else:
+            results = (self.regress_common(*args) for args in slice_args)
+
+        for (slice_indep, slice_all), result in zip(slices, results):
+            self._fit_prms[slice_indep], regression[slice_all] = result
 
         return regression
 
-    def regress_common(self, predictor, data, weights, bounds):
+    def regress_parallel(self, slice_args: list[tuple]) -> list[tuple]:
+        """
+        Runs `regress_common` for each slice in a process pool. The extrapolation object is sent to
+        each worker once, the slices are sent in chunks. Results are returned in the original order.
+        Subclasses must be importable by the worker processes, i.e. not defined in `__main__` when
+        using the "spawn" start method.
+        """
+        n_workers = self.n_workers if self.n_workers is not None else os.cpu_count()
+        n_workers = max(1, min(n_workers, len(slice_args)))
+        if self.chunk_size is not None:
+            chunk_size = self.chunk_size
+        else:
+            chunk_size = max(1, -(-len(slice_args) // (4 * n_workers)))
+        with ProcessPoolExecutor(
+            max_workers=n_workers, initializer=_init_regression_worker, initargs=(self,)
+        ) as executor:
+            return list(executor.map(_regress_slice, slice_args, chunksize=chunk_size))
+
+    def to_batched(self, array: np.ndarray) -> np.ndarray:
+        """
+        Moves the independent dimensions of an array shaped like `predictor_values` (or
+        `data_to_extrapolate`) to the end and flattens them into a single slice axis.
+        Parameter arrays of shape (n_prms, n_slices) then broadcast against the result in `func`.
+        """
+        indep = sorted(self.independent_dims)
+        n_indep = len(indep)
+        moved = np.moveaxis(array, indep, range(array.ndim - n_indep, array.ndim))
+        return moved.reshape(moved.shape[: moved.ndim - n_indep] + (-1,))
+
+    def from_batched(self, array: np.ndarray, extra_shape: Tuple[int, ...] = ()) -> np.ndarray:
+        """
+        Inverse of `to_batched` for arrays shaped like `predictor_values`, optionally with
+        additional trailing axes of shape `extra_shape`.
+        """
+        indep = sorted(self.independent_dims)
+        n_indep = len(indep)
+        shape = self.predictor_values.shape
+        common_shape = tuple(n for i, n in enumerate(shape) if i not in indep)
+        indep_shape = tuple(shape[i] for i in indep)
+        unflattened = array.reshape(common_shape + extra_shape + indep_shape)
+        ndim = unflattened.ndim
+        return np.moveaxis(unflattened, range(ndim - n_indep, ndim), indep)
+
+    def regress_batched(self):
+        """
+        Fits all slices along `independent_dims` at once with a vectorized Levenberg-Marquardt
+        solver. As the slices do not share parameters, the Jacobian is block-diagonal, so each
+        iteration solves one small normal equation system per slice in a single batched call.
+        """
+        predictor_shape = tuple(
+            [self.predictor_values.shape[i] for i in sorted(self.independent_dims)]
+        )
+        n_slices = int(np.prod(predictor_shape))
+        bounds_array = self.bound_list.to_np_array(self.prm_names)
+
+        predictor = self.to_batched(self.predictor_values)
+        data = self.to_batched(self.data_to_extrapolate)
+        weights = self.to_batched(self.weights)
+        historic_predictor = self.transform_predictor(predictor[: self.n_historic, ...])
+
+        # initial guesses and bounds per slice, shape (n_prms, n_slices)
+        if self.initial_prms is not None:
+            initial_guess = self.initial_prms.reshape(n_slices, self.n_prms).T.astype(float)
+        else:
+            initial_guess = self.initial_guesses()
+        if bounds_array is None:
+            lower = np.full_like(initial_guess, -np.inf)
+            upper = np.full_like(initial_guess, np.inf)
+        else:
+            bounds_array = np.broadcast_to(bounds_array, predictor_shape + (2, self.n_prms))
+            bounds_array = bounds_array.reshape(n_slices, 2, self.n_prms)
+            lower = bounds_array[:, 0, :].T
+            upper = bounds_array[:, 1, :].T
+        outside_bounds = (initial_guess < lower) + (initial_guess > upper)
+        initial_guess[outside_bounds] = (lower[outside_bounds] + upper[outside_bounds]) / 2
+
+        def fitting_function(prms: np.ndarray) -> np.ndarray:
+            loss = weights * (self.transformed_func(historic_predictor, prms) - data)
+            return loss.reshape(-1, n_slices)
+
+        def jacobian_function(prms: np.ndarray) -> np.ndarray:
+            jacobian = weights * self.jac(historic_predictor, prms)
+            return np.moveaxis(jacobian, 0, -2).reshape(-1, self.n_prms, n_slices)
+
+        fit_prms = batched_least_squares(
+            fitting_function,
+            initial_guess,
+            lower,
+            upper,
+            jac=jacobian_function if self.has_jac else None,
+        )
+
+        self._fit_prms = fit_prms.T.reshape(predictor_shape + (self.n_prms,))
+        return self.predict()
+
+    def initial_guesses(self) -> np.ndarray:
+        """Initial guesses of all slices along `independent_dims`, of shape (n_prms, n_slices)."""
+        predictor = self.to_batched(self.predictor_values)
+        data = self.to_batched(self.data_to_extrapolate)
+        return np.stack(
+            [
+                self.initial_guess(predictor[..., i], data[..., i]).astype(float)
+                for i in range(predictor.shape[-1])
+            ],
+            axis=-1,
+        )
+
+    def regress_common(self, predictor, data, weights, bounds, initial_guess=None):
         """
         Finds optimal fit of data through least squares. Weights and bounds are applied.
+        If no initial guess is given, it is determined by `initial_guess`.
         """
+        transformed_predictor = self.transform_predictor(predictor)
         fitting_function = self.get_fitting_function(
-            predictor[: self.n_historic, ...],
+            transformed_predictor[: self.n_historic, ...],
             data,
             weights,
         )
-        initial_guess = self.initial_guess(predictor, data)
+        if self.has_jac:
+            jac = self.get_jacobian_function(transformed_predictor[: self.n_historic, ...], weights)
+        else:
+            jac = "2-point"
+        if initial_guess is None:
+            initial_guess = self.initial_guess(predictor, data)
+        else:
+            initial_guess = np.array(initial_guess, dtype=float)
         # correct initial guess
         outside_bounds = (initial_guess < bounds[0]) + (initial_guess > bounds[1])
         if np.any(outside_bounds):
             initial_guess[outside_bounds] = (
                 bounds[0][outside_bounds] + bounds[1][outside_bounds]
             ) / 2
-        fit_prms = least_squares(fitting_function, x0=initial_guess, gtol=1.0e-12, bounds=bounds).x
-        regression = self.func(predictor, fit_prms)
+        result = least_squares(
+            fitting_function, x0=initial_guess, jac=jac, gtol=1.0e-12, bounds=bounds
+        )
+        record("least_squares_nfev", result.nfev)
+        fit_prms = result.x
+        regression = self.transformed_func(transformed_predictor, fit_prms)
         return fit_prms, regression
 
 
@@ -169,9 +495,54 @@ class ProportionalExtrapolation(Extrapolation):
     def func(x, prms):
         return prms[0] * x
 
+    @staticmethod
+    def jac(x, prms):
+        return x[np.newaxis, ...]
+
     def initial_guess(self, predictor_values, data_to_extrapolate):
         return np.array([1.0])
 
+    def regress(self):
+        """
+        Weighted least squares for a single linear parameter has a closed-form solution, which is
+        evaluated for all slices at once, regardless of `regression_mode`. Box bounds are applied
+        by clipping, which is exact for a convex problem in one parameter.
+        Subclasses changing the functional form fall back to the iterative regression.
+        As there is nothing to warm-start and the solution is cheap to compute, `fit_cache` is
+        neither read nor written, and `initial_prms` are not used.
+        """
+        if type(self).func is not ProportionalExtrapolation.func:
+            return super().regress()
+
+        predictor_shape = tuple(
+            [self.predictor_values.shape[i] for i in sorted(self.independent_dims)]
+        )
+        predictor = self.to_batched(self.predictor_values)
+        x = predictor[: self.n_historic, ...]
+        y = self.to_batched(self.data_to_extrapolate)
+        w2 = self.to_batched(self.weights) ** 2
+
+        # sum over time and all commonly regressed dimensions, keep the slice axis
+        common_axes = tuple(range(x.ndim - 1))
+        numerator = np.sum(w2 * x * y, axis=common_axes)
+        denominator = np.sum(w2 * x * x, axis=common_axes)
+        # without information on the slope, the solver would stay at the initial guess
+        no_slope = denominator <= 0
+        factor = np.divide(numerator, denominator, out=np.ones_like(numerator), where=~no_slope)
+
+        bounds_array = self.bound_list.to_np_array(self.prm_names)
+        if bounds_array is not None:
+            bounds_array = np.broadcast_to(bounds_array, predictor_shape + (2, self.n_prms))
+            lower, upper = bounds_array.reshape(-1, 2).T
+            # same initial guess correction as in regress_common
+            outside = no_slope & ((factor < lower) | (factor > upper))
+            factor[outside] = (lower[outside] + upper[outside]) / 2
+            factor = np.clip(factor, lower, upper)
+
+        fit_prms = factor[np.newaxis, :]
+        self._fit_prms = fit_prms.T.reshape(predictor_shape + (self.n_prms,))
+        return self.predict()
+
 
 class PehlExtrapolation(Extrapolation):
 
@@ -181,6 +552,11 @@ class PehlExtrapolation(Extrapolation):
     def func(x, prms):
         return prms[0] / (1.0 + np.exp(prms[1] / x))
 
+    @staticmethod
+    def jac(x, prms):
+        s = 1.0 / (1.0 + np.exp(prms[1] / x))
+        return np.stack(np.broadcast_arrays(s, -prms[0] * s * (1.0 - s) / x))
+
     def initial_guess(self, predictor_values, data_to_extrapolate):
         return np.array(
             [
@@ -198,6 +574,11 @@ class ExponentialSaturationExtrapolation(Extrapolation):
     def func(x, prms):
         return prms[0] * (1 - np.exp(-prms[1] * x))
 
+    @staticmethod
+    def jac(x, prms):
+        e = np.exp(-prms[1] * x)
+        return np.stack(np.broadcast_arrays(1 - e, prms[0] * x * e))
+
     def initial_guess(self, predictor_values, data_to_extrapolate):
         current_level = np.max(data_to_extrapolate[-1, ...])
         current_extrapolator = np.max(predictor_values[self.n_historic - 1, ...])
@@ -216,6 +597,12 @@ class SigmoidExtrapolation(Extrapolation):
     def func(x, prms):
         return prms[0] / (1.0 + np.exp(-prms[1] * (x - prms[2])))
 
+    @staticmethod
+    def jac(x, prms):
+        s = 1.0 / (1.0 + np.exp(-prms[1] * (x - prms[2])))
+        ds = prms[0] * s * (1.0 - s)
+        return np.stack(np.broadcast_arrays(s, ds * (x - prms[2]), -ds * prms[1]))
+
     def initial_guess(self, predictor_values, data_to_extrapolate):
         max_level = np.max(data_to_extrapolate)
         sat_level_guess = 2 * max_level
@@ -236,5 +623,13 @@ class LogSigmoidExtrapolation(SigmoidExtrapolation):
     def func(x, prms):
         return SigmoidExtrapolation.func(np.log10(x), prms)
 
+    @staticmethod
+    def transform_predictor(x):
+        return np.log10(x)
+
+    @staticmethod
+    def transformed_func(x, prms):
+        return SigmoidExtrapolation.func(x, prms)
+
     def initial_guess(self, predictor_values, data_to_extrapolate):
         return super().initial_guess(np.log10(predictor_values), data_to_extrapolate)
@@ -0,0 +1,91 @@
+import logging
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Optional
+
+
+def init_render_worker():
+    import matplotlib
+
+    # workers only write files, so no interactive backend is needed
+    matplotlib.use("Agg")
+
+
+def render_figure(spec: Any, plotting_engine: str, path: str, save_kwargs: dict):
+    """
+    Writes a figure to a file, with the format given by the file extension, e.g. png or svg.
+    Plotly figures are passed as their JSON spec, matplotlib figures as pickled figures.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if plotting_engine == "plotly":
+        import plotly.io as pio
+
+        fig = pio.from_json(spec) if isinstance(spec, str) else spec
+        fig.write_image(path, **save_kwargs)
+    elif plotting_engine == "pyplot":
+        from matplotlib import pyplot as plt
+
+        # sizes are given in pixels like for plotly, which savefig does not take, so they are set
+        # on a copy, as the figure may still be shown
+        save_kwargs = dict(save_kwargs)
+        width, height = save_kwargs.pop("width", None), save_kwargs.pop("height", None)
+        fig = pickle.loads(pickle.dumps(spec))
+        try:
+            if width is not None and height is not None:
+                fig.set_size_inches(width / fig.dpi, height / fig.dpi)
+            fig.savefig(path, **save_kwargs)
+        finally:
+            # unpickled pyplot figures are registered with pyplot until closed
+            plt.close(fig)
+    else:
+        raise ValueError(f"Unknown plotting engine: {plotting_engine}")
+
+
+class FigureRenderQueue:
+    """
+    Writes figures to files in a pool of worker processes, as encoding images (e.g. with kaleido
+    for plotly) takes much longer than building the figures.
+    The figures are built in the main process and passed on as specs, such that the main process
+    can go on with other figures or the data export while the workers encode them.
+    The pool is started on the first figure, so runs without saved figures do not start it.
+    With `n_workers` 0, figures are written in the main process right away.
+    """
+
+    def __init__(self, n_workers: int = 0):
+        self.n_workers = n_workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.futures: dict[str, Future] = {}
+
+    def submit(self, fig: Any, plotting_engine: str, path: str, **save_kwargs):
+        if self.n_workers <= 0:
+            render_figure(fig, plotting_engine, path, save_kwargs)
+            return
+        if self.executor is None:
+            # forking is unsafe if the model runs in a thread, e.g. in a combined run
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.n_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_render_worker,
+            )
+        spec = fig.to_json() if plotting_engine == "plotly" else fig
+        self.futures[path] = self.executor.submit(
+            render_figure, spec, plotting_engine, path, save_kwargs
+        )
+
+    def wait(self):
+        """Waits until all figures are written. Raises an error naming any that failed."""
+        failed = []
+        for path, future in self.futures.items():
+            try:
+                future.result()
+            except Exception as error:
+                logging.error(f"Could not save figure {path}: {type(error).__name__}: {error}")
+                failed.append(path)
+        self.futures = {}
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if failed:
+            raise RuntimeError(f"Could not save {len(failed)} figure(s): {', '.join(failed)}")
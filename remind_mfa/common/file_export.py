@@ -0,0 +1,106 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import IO, Callable, Iterator, Optional
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w", **open_kwargs) -> Iterator[IO]:
+    """
+    Opens a temporary file next to `path`, which replaces `path` once the block has completed,
+    such that concurrent readers in other threads or processes never see a partially written file.
+    If the block raises an error, the temporary file is removed and `path` is left unchanged.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, **open_kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class FileExportQueue:
+    """
+    Writes export files in a bounded pool of threads, such that the model can go on with the
+    visualization while the files are written. Writing files mostly waits for the disk or network
+    storage and for compression and encoding in pyarrow, h5py and pandas, which release the GIL.
+    Files are submitted one by one with the path they are written to, and `as_future` returns a
+    future for all of them, which reports the files that could not be written.
+    With `n_workers` 0, files are written right away in the calling thread.
+    """
+
+    def __init__(self, n_workers: int = 0):
+        self.n_workers = n_workers
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.futures: dict[str, Future] = {}
+        self.start_time: Optional[float] = None
+
+    def submit(self, path: str, func: Callable, *args, **kwargs):
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        if self.n_workers <= 0:
+            future = Future()
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as error:
+                future.set_exception(error)
+        else:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.n_workers, thread_name_prefix="export"
+                )
+            future = self.executor.submit(func, *args, **kwargs)
+        self.futures[path] = future
+
+    def as_future(self) -> Future:
+        """
+        Future which is done once all files submitted so far are written, with their paths as
+        result. If any failed, each is logged and the future raises an error naming all of them.
+        """
+        futures, self.futures = self.futures, {}
+        start_time, self.start_time = self.start_time, None
+        if self.executor is not None:
+            # the submitted files are still written, but no threads are left behind afterwards
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+        joined = Future()
+        joined.set_running_or_notify_cancel()
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def finish():
+            failed = []
+            for path, future in futures.items():
+                error = future.exception()
+                if error is not None:
+                    logging.error(f"Could not export {path}: {type(error).__name__}: {error}")
+                    failed.append(path)
+            if failed:
+                joined.set_exception(
+                    RuntimeError(f"Could not export {len(failed)} file(s): {', '.join(failed)}")
+                )
+                return
+            if futures:
+                duration = time.perf_counter() - start_time
+                logging.info(f"Exported {len(futures)} file(s) in {duration:.2f} s")
+            joined.set_result(list(futures))
+
+        def on_done(future: Future):
+            with lock:
+                remaining[0] -= 1
+                is_last = remaining[0] == 0
+            if is_last:
+                finish()
+
+        if not futures:
+            finish()
+        for future in futures.values():
+            future.add_done_callback(on_done)
+        return joined
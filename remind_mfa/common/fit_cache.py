@@ -0,0 +1,85 @@
+import hashlib
+import os
+import numpy as np
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from remind_mfa.common.base_model import RemindMFABaseModel
+from remind_mfa.common.file_export import atomic_write
+
+if TYPE_CHECKING:
+    from remind_mfa.common.data_extrapolations import Extrapolation
+
+
+def hash_arrays(*arrays: np.ndarray) -> str:
+    """Hash of the shapes, data types and contents of the given arrays."""
+    h = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        h.update(str((array.shape, array.dtype.str)).encode())
+        h.update(array.tobytes())
+    return h.hexdigest()
+
+
+class FitCache(RemindMFABaseModel):
+    """
+    On-disk cache of fitted extrapolation parameters.
+    There is one entry per extrapolation class, bounds, independent dimensions, regression mode
+    and array shapes, holding the parameters of the last fit together with a hash of the fitted
+    data and of the initial guess given by the caller.
+    If the hash matches (exact hit), the stored parameters are returned without fitting. These are
+    the optimum found by the fit that stored them, which may have started from the parameters of
+    an earlier entry, so that they can differ from a fit without cache within the solver tolerance.
+    Otherwise (near hit), they serve as initial guess for the fit, unless the caller gives one.
+    """
+
+    cache_dir: str
+
+    def entry_path(self, extrapolation: "Extrapolation") -> str:
+        bounds_array = extrapolation.bound_list.to_np_array(extrapolation.prm_names)
+        key = hashlib.sha256()
+        key.update(type(extrapolation).__name__.encode())
+        key.update(str(extrapolation.prm_names).encode())
+        key.update(str(sorted(extrapolation.independent_dims)).encode())
+        key.update(extrapolation.regression_mode.encode())
+        key.update(str(extrapolation.data_to_extrapolate.shape).encode())
+        key.update(str(extrapolation.predictor_values.shape[1:]).encode())
+        key.update(b"no bounds" if bounds_array is None else hash_arrays(bounds_array).encode())
+        filename = f"{type(extrapolation).__name__}_{key.hexdigest()[:16]}.npz"
+        return os.path.join(self.cache_dir, filename)
+
+    @staticmethod
+    def data_hash(extrapolation: "Extrapolation") -> str:
+        """
+        Only the historic part of the predictor enters the fit. The initial guess is included if
+        given by the caller, as the solver may converge to another local optimum from there.
+        """
+        arrays = [
+            extrapolation.data_to_extrapolate,
+            extrapolation.predictor_values[: extrapolation.n_historic, ...],
+            extrapolation.weights,
+        ]
+        if extrapolation.initial_prms is not None:
+            arrays.append(extrapolation.initial_prms)
+        return hash_arrays(*arrays)
+
+    def lookup(self, extrapolation: "Extrapolation") -> Tuple[Optional[np.ndarray], bool]:
+        """
+        Returns the cached parameters (None if there is no entry) and whether it is an exact hit.
+        """
+        path = self.entry_path(extrapolation)
+        if not os.path.exists(path):
+            return None, False
+        with np.load(path) as entry:
+            fit_prms = entry["fit_prms"]
+            exact = str(entry["data_hash"]) == self.data_hash(extrapolation)
+        return fit_prms, exact
+
+    def store(self, extrapolation: "Extrapolation"):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.entry_path(extrapolation)
+        with atomic_write(path, "wb") as f:
+            np.savez(
+                f,
+                fit_prms=extrapolation.fit_prms,
+                data_hash=np.array(self.data_hash(extrapolation)),
+            )
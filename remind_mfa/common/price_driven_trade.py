@@ -1,8 +1,46 @@
+import logging
 import numpy as np
 import flodym as fd
+from typing import Literal, Optional
 from pydantic import ConfigDict, model_validator
 
 from remind_mfa.common.base_model import RemindMFABaseModel
+from remind_mfa.common.profiling import record
+
+
+class TradeKernel:
+    """
+    Evaluates the trade model on plain arrays with the region as first axis and all other
+    dimensions flattened into the second axis. Buffers for the origin shares and the trade are
+    allocated once for `n_columns` and reused in every evaluation, also for fewer columns.
+    """
+
+    def __init__(self, mu: float, local_price_factor: np.ndarray, n_columns: int):
+        n_regions = local_price_factor.shape[0]
+        self.mu = mu
+        self.local_price_factor = local_price_factor[:, :, np.newaxis]
+        self.diagonal = np.diag_indices(n_regions)
+        self.shares = np.empty((n_regions, n_regions, n_columns))
+        self.trade = np.empty((n_regions, n_regions, n_columns))
+
+    def origin_shares(self, price: np.ndarray) -> np.ndarray:
+        """Softmax over the source regions R, shifted by its maximum for numerical stability."""
+        shares = self.shares[:, :, : price.shape[1]]
+        np.multiply(price[:, np.newaxis, :], self.local_price_factor, out=shares)
+        shares *= -self.mu
+        shares -= shares.max(axis=0, keepdims=True)
+        np.exp(shares, out=shares)
+        shares /= shares.sum(axis=0, keepdims=True)
+        return shares
+
+    def get_trade(self, price: np.ndarray, demand: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        shares = self.origin_shares(price)
+        trade = self.trade[:, :, : price.shape[1]]
+        np.multiply(shares, demand[np.newaxis, :, :], out=trade)
+        trade[self.diagonal] = 0.0
+        imports = trade.sum(axis=0)
+        exports = trade.sum(axis=1)
+        return imports, exports
 
 
 class PriceDrivenTrade(RemindMFABaseModel):
@@ -15,7 +53,26 @@ class PriceDrivenTrade(RemindMFABaseModel):
     """OOM: 1/price; Higher mu means more price-elastic"""
     learning_rate: float = 0.2
     convergence_tol: float = 0.01
+    """Tolerance for the market clearing, as excess supply relative to the largest initial supply
+    over all years, and for the changes of the calibrated factors."""
     max_iter: int = 1000
+    solver: Literal["fixed_point", "anderson", "newton"] = "fixed_point"
+    """Solver for the market clearing prices in `compute_price_driven_trade`.
+    "fixed_point": damped price update by the relative excess supply.
+    "anderson": fixed point update with Anderson acceleration.
+    "newton": Newton steps with the analytic Jacobian of the excess supply, one linear system per
+    time step and region-independent dimension.
+    """
+    anderson_memory: int = 5
+    """Number of previous iterates used by the Anderson acceleration."""
+    time_chunk_size: Optional[int] = None
+    """If given, `compute_price_driven_trade` solves blocks of this many years one after another,
+    such that the trade tensors only have to be held in memory for one block at a time.
+    """
+    numpy_kernel: bool = True
+    """Iterate on plain arrays with a `TradeKernel` instead of FlodymArrays. Dimensions are aligned
+    once before the iteration. Requires demand and supply to have the same dimensions as the price.
+    """
     dims: fd.DimensionSet
 
     @model_validator(mode="after")
@@ -25,6 +82,9 @@ class PriceDrivenTrade(RemindMFABaseModel):
         self.all_dims = self.dims.expand_by([self.source_region])
         self.domestic_preference = None
         self.export_penalty = None
+        self.n_iter = None
+        self.n_iter_calibration = None
+        self.kernel = None
         return self
 
     def compute_price_driven_trade(
@@ -33,37 +93,274 @@ class PriceDrivenTrade(RemindMFABaseModel):
         demand_0: fd.FlodymArray,
         supply_0: fd.FlodymArray,
     ):
-
-        # scalar parameters:
+        """
+        Finds the prices at which supply meets demand plus net exports in every region.
+        The number of iterations needed by the chosen solver, counting the one in which the market
+        is found cleared, is stored in `n_iter` and logged. If the years are solved in blocks, it
+        is the maximum over all blocks.
+        """
 
         if self.domestic_preference is None:
             raise RuntimeError("Domestic preference not set. Call calibrate first.")
 
-        # init values: multiplication makes a copy
-        price = 1.0 * price_0
-        supply = 1.0 * supply_0
-        demand = 1.0 * demand_0
+        # absolute, such that blocks of years converge like the whole horizon
+        self.excess_tol = self.convergence_tol * np.max(np.abs(supply_0.values))
+        self.kernel = None
+
+        if self.time_chunk_size is None:
+            results = self.solve_market(price_0, demand_0, supply_0)
+            self.log_iterations("market clearing", self.n_iter)
+            return results
+
+        # years are independent, so they can be solved in blocks
+        time = price_0.dims["t"]
+        if self.numpy_kernel:
+            # one kernel for the largest block, which the last block uses part of
+            n_columns = price_0.values.size // (self.n_regi * time.len)
+            self.kernel = self.make_kernel(n_columns * min(self.time_chunk_size, time.len))
+        results = None
+        n_iter = 0
+        for start in range(0, time.len, self.time_chunk_size):
+            chunk = fd.Dimension(
+                name="Time chunk",
+                letter="c",
+                items=time.items[start : start + self.time_chunk_size],
+            )
+            chunk_results = self.solve_market(
+                price_0[{"t": chunk}], demand_0[{"t": chunk}], supply_0[{"t": chunk}]
+            )
+            n_iter = max(n_iter, self.n_iter)
+            if results is None:
+                results = [fd.FlodymArray(dims=r.dims.replace("c", time)) for r in chunk_results]
+            for result, chunk_result in zip(results, chunk_results):
+                result[{"t": chunk}] = chunk_result
+        self.n_iter = n_iter
+        self.log_iterations("market clearing", self.n_iter)
+        return tuple(results)
+
+    def solve_market(
+        self,
+        price_0: fd.FlodymArray,
+        demand_0: fd.FlodymArray,
+        supply_0: fd.FlodymArray,
+    ):
+        self.price_0 = price_0
+        self.demand_0 = demand_0
+        self.supply_0 = supply_0
+        if self.numpy_kernel:
+            self.compile_kernel()
+
+        if self.solver == "fixed_point":
+            log_price = self.solve_fixed_point()
+        elif self.solver == "anderson":
+            log_price = self.solve_anderson()
+        elif self.solver == "newton":
+            log_price = self.solve_newton()
+        else:
+            raise ValueError(f"Unknown solver {self.solver}.")
 
+        if not self.numpy_kernel:
+            price = 1.0 * price_0
+            price.values[...] = self.from_region_first(np.exp(log_price))
+            demand, supply, imports, exports, _ = self.market_state(price)
+            return price, demand, supply, imports, exports
+
+        results = self.kernel_market_state(log_price)[:4]
+        price = fd.FlodymArray(dims=price_0.dims, values=self.from_region_first(np.exp(log_price)))
+        return (price,) + tuple(
+            fd.FlodymArray(dims=price_0.dims, values=self.from_region_first(r)) for r in results
+        )
+
+    def to_region_first(
+        self, array: fd.FlodymArray, dims: Optional[fd.DimensionSet] = None
+    ) -> np.ndarray:
+        """
+        Values with the region as first axis and all other dimensions flattened, in the order of
+        `dims`. Defaults to the dimensions of the initial price.
+        """
+        if dims is None:
+            dims = self.price_0.dims
+        values = array.cast_to(dims).values
+        return np.moveaxis(values, dims.letters.index("r"), 0).reshape(self.n_regi, -1)
+
+    def from_region_first(self, values: np.ndarray) -> np.ndarray:
+        """Inverse of `to_region_first`."""
+        r_axis = self.price_0.dims.letters.index("r")
+        region_first_shape = np.moveaxis(self.price_0.values, r_axis, 0).shape
+        return np.moveaxis(values.reshape(region_first_shape), 0, r_axis)
+
+    def compile_kernel(self):
+        """
+        Resolves all dimension alignments once before the iteration. An existing kernel is reused
+        if its buffers are large enough.
+        """
+        self.kernel_price_0 = self.to_region_first(self.price_0)
+        self.kernel_demand_0 = self.to_region_first(self.demand_0)
+        self.kernel_supply_0 = self.to_region_first(self.supply_0)
+        n_columns = self.kernel_price_0.shape[1]
+        if self.kernel is None or self.kernel.shares.shape[2] < n_columns:
+            self.kernel = self.make_kernel(n_columns)
+
+    def make_kernel(self, n_columns: int) -> TradeKernel:
+        return TradeKernel(
+            self.mu,
+            self.local_price_factor(self.export_penalty.values, self.domestic_preference.values),
+            n_columns=n_columns,
+        )
+
+    def region_first_inputs(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Initial price, demand and supply as region-first arrays."""
+        if self.numpy_kernel:
+            return self.kernel_price_0, self.kernel_demand_0, self.kernel_supply_0
+        return (
+            self.to_region_first(self.price_0),
+            self.to_region_first(self.demand_0),
+            self.to_region_first(self.supply_0),
+        )
+
+    def market_state(self, price: fd.FlodymArray):
+        """Demand, supply, trade and the supply needed to serve demand and net exports."""
+        demand = self.demand_0 * (price / self.price_0) ** self.eta_demand
+        supply = self.supply_0 * (price / self.price_0) ** self.eta_supply
+        imports, exports = self.get_trade(price, demand)
+        supply_target = demand + exports - imports
+        return demand, supply, imports, exports, supply_target
+
+    def kernel_market_state(self, log_price: np.ndarray):
+        """Same as `market_state`, on region-first arrays."""
+        price = np.exp(log_price)
+        relative_price = price / self.kernel_price_0
+        demand = self.kernel_demand_0 * relative_price**self.eta_demand
+        supply = self.kernel_supply_0 * relative_price**self.eta_supply
+        imports, exports = self.kernel.get_trade(price, demand)
+        supply_target = demand + exports - imports
+        return demand, supply, imports, exports, supply_target
+
+    def excess_supply(self, log_price: np.ndarray) -> tuple[np.ndarray, np.ndarray, bool]:
+        """
+        Evaluates the market at the given region-first log prices.
+        Returns excess supply, the fixed point price update and whether the market is cleared.
+        """
+        if self.numpy_kernel:
+            _, supply, _, _, supply_target = self.kernel_market_state(log_price)
+        else:
+            price = 1.0 * self.price_0
+            price.values[...] = self.from_region_first(np.exp(log_price))
+            _, supply, _, _, supply_target = self.market_state(price)
+            supply = self.to_region_first(supply)
+            supply_target = self.to_region_first(supply_target)
+        excess = supply - supply_target
+        log_update = self.learning_rate / self.eta_supply * np.log(supply_target / supply)
+        return excess, log_update, np.max(np.abs(excess)) < self.excess_tol
+
+    def solve_fixed_point(self) -> np.ndarray:
+        log_price = np.log(self.to_region_first(self.price_0))
         for i in range(self.max_iter):
+            _, log_update, converged = self.excess_supply(log_price)
+            if converged:
+                self.n_iter = i + 1
+                return log_price
+            log_price = log_price + log_update
+        self.raise_not_converged()
 
-            # demand and supply
-            demand = demand_0 * (price / price_0) ** self.eta_demand
-            supply = supply_0 * (price / price_0) ** self.eta_supply
+    def solve_anderson(self) -> np.ndarray:
+        """
+        Anderson acceleration of the fixed point iteration: The next iterate is the combination of
+        the last fixed point updates which minimizes the linearized residual.
+        """
+        log_price = np.log(self.to_region_first(self.price_0))
+        shape = log_price.shape
+        log_price = log_price.ravel()
+        iterates, residuals = [], []
+        for i in range(self.max_iter):
+            _, log_update, converged = self.excess_supply(log_price.reshape(shape))
+            if converged:
+                self.n_iter = i + 1
+                return log_price.reshape(shape)
+            iterates.append(log_price + log_update.ravel())
+            residuals.append(log_update.ravel())
+            iterates = iterates[-(self.anderson_memory + 1) :]
+            residuals = residuals[-(self.anderson_memory + 1) :]
+            if len(residuals) == 1:
+                log_price = iterates[-1]
+                continue
+            residual_diffs = np.diff(np.array(residuals), axis=0).T
+            iterate_diffs = np.diff(np.array(iterates), axis=0).T
+            gamma = np.linalg.lstsq(residual_diffs, residuals[-1], rcond=None)[0]
+            log_price = iterates[-1] - iterate_diffs @ gamma
+        self.raise_not_converged()
 
-            imports, exports = self.get_trade(price, demand)
+    def solve_newton(self) -> np.ndarray:
+        """
+        Newton iteration on the log prices. As time steps (and all other dimensions except the
+        region) are independent, the Jacobian is block diagonal and each block is solved separately.
+        Steps are halved for blocks where they do not decrease the excess supply.
+        """
+        log_price = np.log(self.to_region_first(self.price_0))
+        excess, _, converged = self.excess_supply(log_price)
+        for i in range(self.max_iter):
+            if converged:
+                self.n_iter = i + 1
+                return log_price
+            jacobian = self.excess_supply_jacobian(log_price)
+            step = np.linalg.solve(jacobian, -excess.T[..., np.newaxis])[..., 0].T
+            error = np.max(np.abs(excess), axis=0)
+            step_size = np.ones_like(error)
+            for _ in range(10):
+                trial = log_price + step_size * step
+                trial_excess, _, converged = self.excess_supply(trial)
+                worse = np.max(np.abs(trial_excess), axis=0) > error
+                if not np.any(worse):
+                    break
+                step_size[worse] /= 2.0
+            log_price, excess = trial, trial_excess
+        self.raise_not_converged()
 
-            # adjust price
-            supply_target = demand + exports - imports
-            price_factor = (supply_target / supply) ** (1 / self.eta_supply)
-            price *= price_factor**self.learning_rate
+    def excess_supply_jacobian(self, log_price: np.ndarray) -> np.ndarray:
+        """
+        Derivative of the excess supply of region R with respect to the log price of region k.
+        The supply needed in region R is sum_r S[R,r] d_r with the (softmax) origin shares S
+        including the domestic share. Its derivative with respect to the log price of k has a
+        contribution from the demand elasticity and one from the shift of origin shares:
+        dS[R,r]/dlogp_k = S[R,r] (delta_Rk - S[k,r]) g[k,r], with g[k,r] = -mu p_k C[k,r], where C
+        is the product of export penalty and domestic preference.
+        Takes region-first log prices and returns an array of shape (n_columns, R, k).
+        """
+        price_0, demand_0, supply_0 = self.region_first_inputs()
+        p = np.exp(log_price)
+        relative_price = p / price_0
+        demand = demand_0 * relative_price**self.eta_demand
+        supply = supply_0 * relative_price**self.eta_supply
+        penalty = self.local_price_factor(
+            self.export_penalty.values, self.domestic_preference.values
+        )
+        if self.numpy_kernel:
+            shares = self.kernel.origin_shares(p)
+        else:
+            price = 1.0 * self.price_0
+            price.values[...] = self.from_region_first(p)
+            shares = self.origin_shares(price).cast_to(self.trade_dims(price)).values
+            shares = shares.reshape(self.n_regi, self.n_regi, -1)
+        g = -self.mu * p[:, np.newaxis, :] * penalty[:, :, np.newaxis]
+        weighted = shares * g * demand[np.newaxis, :, :]
 
-            # check convergence
-            excess = supply - supply_target
-            max_error = np.max(np.abs(excess.values)) / np.max(np.abs(supply_target.values))
-            if max_error < self.convergence_tol:
-                return price, demand, supply, imports, exports
+        jacobian = np.einsum("Rrc,krc->cRk", shares, weighted)
+        jacobian -= self.eta_demand * np.moveaxis(shares * demand[np.newaxis, :, :], 2, 0)
+        diagonal = self.eta_supply * supply - np.sum(weighted, axis=1)
+        n = self.n_regi
+        jacobian[:, np.arange(n), np.arange(n)] += diagonal.T
+        return jacobian
 
-        raise RuntimeError("Could not converge to a solution for the price driven trade.")
+    def log_iterations(self, name: str, n_iter: int):
+        """Logs the number of iterations and records it for the current profiling stage."""
+        logging.info(f"Price driven trade {name} converged in {n_iter} iterations.")
+        record(f"{name.replace(' ', '_')}_iterations", n_iter)
+
+    def raise_not_converged(self):
+        raise RuntimeError(
+            f"Could not converge to a solution for the price driven trade with solver "
+            f"{self.solver} in {self.max_iter} iterations."
+        )
 
     def calibrate(
         self,
@@ -78,6 +375,10 @@ class PriceDrivenTrade(RemindMFABaseModel):
         self.domestic_preference = fd.FlodymArray(dims=self.all_dims["r",])
         self.domestic_preference[...] = 1.0
 
+        if self.numpy_kernel:
+            self.calibrate_kernel(demand, price, imports_target, exports_target)
+            return
+
         export_shares_target = exports_target.get_shares_over("r")
         domestic_share_target = (demand - imports_target) / demand
 
@@ -103,6 +404,70 @@ class PriceDrivenTrade(RemindMFABaseModel):
             self.domestic_preference += self.learning_rate * domestic_preference_diff
 
             if self.almost_zero(export_penalty_diff) and self.almost_zero(domestic_preference_diff):
+                self.n_iter_calibration = i + 1
+                self.log_iterations("calibration", self.n_iter_calibration)
+                return
+
+        raise RuntimeError(
+            "Could not converge to a solution for the export penalty and domestic preference."
+        )
+
+    def calibrate_kernel(
+        self,
+        demand: fd.FlodymArray,
+        price: fd.FlodymArray,
+        imports_target: fd.FlodymArray,
+        exports_target: fd.FlodymArray,
+    ):
+        """Same iteration as in `calibrate`, on region-first arrays."""
+        dims = price.dims
+        demand = self.to_region_first(demand, dims)
+        imports_target = self.to_region_first(imports_target, dims)
+        exports_target = self.to_region_first(exports_target, dims)
+        price = self.to_region_first(price, dims)
+        export_penalty = self.export_penalty.values.copy()
+        domestic_preference = self.domestic_preference.values.copy()
+        kernel = TradeKernel(
+            self.mu,
+            self.local_price_factor(export_penalty, domestic_preference),
+            n_columns=price.shape[1],
+        )
+
+        export_shares_target = exports_target / exports_target.sum(axis=0, keepdims=True)
+        domestic_share_target = (demand - imports_target) / demand
+
+        for i in range(self.max_iter):
+
+            # update trade
+            kernel.local_price_factor[...] = self.local_price_factor(
+                export_penalty, domestic_preference
+            )[:, :, np.newaxis]
+            imports, exports = kernel.get_trade(price, demand)
+
+            # update export penalty; other dimensions are summed like in FlodymArray addition
+            export_shares = exports / exports.sum(axis=0, keepdims=True)
+            export_penalty_diff = np.log(export_shares / export_shares_target) / (
+                self.mu * price * domestic_preference[:, np.newaxis]
+            )
+            export_penalty += self.learning_rate * export_penalty_diff.sum(axis=1)
+            # normalize to avoid run-off
+            export_penalty += 1.0 - export_penalty.min()
+
+            # update domestic preference
+            domestic_share = (demand - imports) / demand
+            domestic_preference_diff = np.log(domestic_share / domestic_share_target) / (
+                self.mu * price * export_penalty[:, np.newaxis]
+            )
+            domestic_preference += self.learning_rate * domestic_preference_diff.sum(axis=1)
+
+            if (
+                np.max(np.abs(export_penalty_diff)) < self.convergence_tol
+                and np.max(np.abs(domestic_preference_diff)) < self.convergence_tol
+            ):
+                self.export_penalty.values[...] = export_penalty
+                self.domestic_preference.values[...] = domestic_preference
+                self.n_iter_calibration = i + 1
+                self.log_iterations("calibration", self.n_iter_calibration)
                 return
 
         raise RuntimeError(
@@ -115,14 +480,7 @@ class PriceDrivenTrade(RemindMFABaseModel):
     def get_trade(
         self, price: fd.FlodymArray, demand: fd.FlodymArray
     ) -> tuple[fd.FlodymArray, fd.FlodymArray]:
-        dims = self.all_dims[
-            (
-                "R",
-                "r",
-            )
-            + tuple(l for l in price.dims.letters if l != "r")
-        ]
-        trade = fd.FlodymArray(dims=dims)
+        trade = fd.FlodymArray(dims=self.trade_dims(price))
         trade[...] = self.origin_shares(price) * demand
         diag_indices = np.diag_indices(self.n_regi) + (slice(None),) * (trade.dims.ndim - 2)
         trade.values[diag_indices] = 0.0
@@ -136,9 +494,28 @@ class PriceDrivenTrade(RemindMFABaseModel):
         )
         return (-self.mu * local_price).apply(np.exp).get_shares_over("R")
 
+    def trade_dims(self, price: fd.FlodymArray) -> fd.DimensionSet:
+        """
+        Source and target region, followed by the other dimensions of the price. These are taken
+        from the price rather than from `dims`, as it may only cover a subset of the years.
+        """
+        other_dims = [dim for dim in price.dims.dim_list if dim.letter != "r"]
+        return fd.DimensionSet(dim_list=[self.source_region, self.dims["r"]] + other_dims)
+
     def price_cast(self, price: fd.FlodymArray) -> fd.FlodymArray:
-        dims = self.all_dims[("R", "r") + tuple(l for l in price.dims.letters if l != "r")]
-        return price[{"r": self.source_region}].cast_to(dims)
+        return price[{"r": self.source_region}].cast_to(self.trade_dims(price))
+
+    def local_price_factor(
+        self, export_penalty: np.ndarray, domestic_preference: np.ndarray
+    ) -> np.ndarray:
+        """
+        Factor on the price of source region R in target region r: the export penalty of R off the
+        diagonal and the domestic preference on the diagonal. Plain-array equivalent of
+        `export_penalty_cast() * domestic_preference_cast()`.
+        """
+        factor = np.repeat(export_penalty[:, np.newaxis], self.n_regi, axis=1)
+        factor[np.diag_indices(self.n_regi)] = domestic_preference
+        return factor
 
     def export_penalty_cast(self) -> fd.FlodymArray:
         cast_out = self.export_penalty[{"r": self.source_region}].cast_to(self.all_dims["R", "r"])
@@ -0,0 +1,178 @@
+import csv
+import functools
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+if TYPE_CHECKING:
+    from remind_mfa.common.common_cfg import ProfilingCfg
+
+
+_profiler: ContextVar[Optional["Profiler"]] = ContextVar("profiler", default=None)
+
+
+def peak_rss() -> int:
+    """Peak resident set size of the process in bytes, 0 if unknown."""
+    if resource is None:
+        return 0
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ProfiledStage:
+
+    def __init__(self, name: str, parent: Optional[str], index: int, trace_allocations: bool):
+        self.name = name
+        self.parent = parent
+        self.index = index
+        self.counters: dict[str, list] = {}
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.start_rss = peak_rss()
+        self.start_traced = tracemalloc.get_traced_memory()[0] if trace_allocations else 0
+        self.max_traced = self.start_traced
+
+    def record(self, name: str, value):
+        self.counters.setdefault(name, []).append(value)
+
+
+class Profiler:
+    """
+    Records wall time, CPU time, increase of the peak resident set size and, optionally, the net
+    and peak memory allocated (via `tracemalloc`, which includes NumPy arrays) for nested stages.
+    Stages are opened with `profile_stage` or `profiled`, which do nothing if no profiler is active.
+    """
+
+    def __init__(self, trace_allocations: bool = False):
+        self.trace_allocations = trace_allocations
+        self.stack: list[ProfiledStage] = []
+        self.results: list[dict] = []
+
+    def start_stage(self, name: str):
+        parent = self.stack[-1] if self.stack else None
+        if self.trace_allocations:
+            # the peak is reset for each stage, so it is passed on to the enclosing stage first
+            if parent is not None:
+                parent.max_traced = max(parent.max_traced, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        path = name if parent is None else f"{parent.name}/{name}"
+        # results are listed in the order the stages start
+        index = len(self.results)
+        self.results.append(None)
+        self.stack.append(
+            ProfiledStage(path, parent and parent.name, index, self.trace_allocations)
+        )
+
+    def end_stage(self):
+        stage = self.stack.pop()
+        result = {
+            "stage": stage.name,
+            "parent": stage.parent,
+            "wall_time": time.perf_counter() - stage.start_wall,
+            "cpu_time": time.process_time() - stage.start_cpu,
+            "peak_rss_increase": peak_rss() - stage.start_rss,
+        }
+        if self.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            stage.max_traced = max(stage.max_traced, peak)
+            result["allocated_net"] = current - stage.start_traced
+            result["allocated_peak"] = stage.max_traced - stage.start_traced
+            if self.stack:
+                self.stack[-1].max_traced = max(self.stack[-1].max_traced, stage.max_traced)
+        for counter, values in stage.counters.items():
+            result[f"{counter}_count"] = len(values)
+            result[f"{counter}_total"] = sum(values)
+        result["counters"] = stage.counters
+        self.results[stage.index] = result
+
+    def record(self, name: str, value):
+        if self.stack:
+            self.stack[-1].record(name, value)
+
+    def write(self, output_path: str):
+        """Writes the stages to profile.json and profile.csv."""
+        os.makedirs(output_path, exist_ok=True)
+        with open(os.path.join(output_path, "profile.json"), "w") as f:
+            json.dump(self.results, f, indent=1)
+        columns = list(dict.fromkeys(k for r in self.results for k in r if k != "counters"))
+        with open(os.path.join(output_path, "profile.csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.results)
+
+    def log_summary(self):
+        lines = ["Profile (wall s, cpu s, peak RSS increase MB):"]
+        for result in self.results:
+            depth = result["stage"].count("/")
+            name = result["stage"].rsplit("/", 1)[-1]
+            lines.append(
+                f"{'  ' * depth}{name:<{40 - 2 * depth}} {result['wall_time']:8.3f} "
+                f"{result['cpu_time']:8.3f} {result['peak_rss_increase'] / 1e6:8.1f}"
+            )
+        logging.info("\n".join(lines))
+
+
+@contextmanager
+def profile_stage(name: str):
+    profiler = _profiler.get()
+    if profiler is None:
+        yield
+        return
+    profiler.start_stage(name)
+    try:
+        yield
+    finally:
+        profiler.end_stage()
+
+
+def profiled(func):
+    """Decorator profiling each call of a function as a stage named after it."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _profiler.get() is None:
+            return func(*args, **kwargs)
+        with profile_stage(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def record(name: str, value):
+    """Adds a value to a counter of the current stage, e.g. the number of function evaluations."""
+    profiler = _profiler.get()
+    if profiler is not None:
+        profiler.record(name, value)
+
+
+@contextmanager
+def profile_run(cfg: "ProfilingCfg", output_path: str):
+    """Profiles the enclosed run as a stage "run" if enabled, and writes the profile afterwards."""
+    if not cfg.enabled:
+        yield
+        return
+    profiler = Profiler(trace_allocations=cfg.trace_allocations)
+    start_tracing = cfg.trace_allocations and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    token = _profiler.set(profiler)
+    try:
+        with profile_stage("run"):
+            yield
+    finally:
+        _profiler.reset(token)
+        if start_tracing:
+            tracemalloc.stop()
+        profiler.write(output_path)
+        if cfg.log_summary:
+            profiler.log_summary()
@@ -1,10 +1,11 @@
 import flodym as fd
 import numpy as np
-from typing import Tuple, Union, Type
+from typing import Optional, Tuple, Union, Type
 from copy import deepcopy
 
 from remind_mfa.common.data_extrapolations import Extrapolation
 from remind_mfa.common.data_transformations import broadcast_trailing_dimensions, BoundList
+from remind_mfa.common.fit_cache import FitCache
 from remind_mfa.common.assumptions_doc import add_assumption_doc
 
 
@@ -24,6 +25,10 @@ class StockExtrapolation:
         bound_list: BoundList = BoundList(),
         do_gdppc_accumulation: bool = True,
         stock_correction: str = "gaussian_first_order",
+        regression_mode: str = "sequential",
+        n_workers: Optional[int] = None,
+        fit_cache: Optional[FitCache] = None,
+        scenario_dim_letter: Optional[str] = None,
     ):
         """
         Initialize the StockExtrapolation class.
@@ -38,6 +43,10 @@ class StockExtrapolation:
             bound_list (BoundList): List of bounds for the extrapolation. Defaults to an empty BoundList.
             do_gdppc_accumulation (bool): Flag to perform GDP per capita accumulation. Defaults to True.
             stock_correction (str): Method for stock correction. Possible values are "gaussian_first_order", "shift_zeroth_order", "none". Defaults to "gaussian_first_order".
+            regression_mode (str): How independent fits are solved, see `Extrapolation.regression_mode`. Defaults to "sequential".
+            n_workers (Optional[int]): Number of worker processes if regression_mode is "parallel". Defaults to None, i.e. the number of CPUs.
+            fit_cache (Optional[FitCache]): Cache of fitted parameters to reuse or warm-start the regression. Defaults to None.
+            scenario_dim_letter (Optional[str]): Letter of a scenario dimension of the population and GDP per capita parameters. If given, the outputs are computed for all scenarios, which are appended as last dimension. Scenarios with the same fit data share one regression, see `group_scenarios`. Historic population and GDP per capita must be the same across scenarios. Defaults to None.
         """
         self.historic_stocks = historic_stocks
         self.dims = dims
@@ -48,6 +57,10 @@ class StockExtrapolation:
         self.bound_list = bound_list
         self.do_gdppc_accumulation = do_gdppc_accumulation
         self.stock_correction = stock_correction
+        self.regression_mode = regression_mode
+        self.n_workers = n_workers
+        self.fit_cache = fit_cache
+        self.scenario_dim_letter = scenario_dim_letter
         self.extrapolate()
 
     def set_dims(self, indep_fit_dim_letters: Tuple[str, ...]):
@@ -86,19 +99,43 @@ class StockExtrapolation:
         self.per_capita_transformation()
         self.gdp_regression()
 
+    @property
+    def output_dim_letters(self) -> Tuple[str, ...]:
+        """Dimensions of the extrapolated stocks, including the scenario dimension if given."""
+        if self.scenario_dim_letter is None:
+            return self.target_dim_letters
+        return self.target_dim_letters + (self.scenario_dim_letter,)
+
     def per_capita_transformation(self):
-        self.pop = self.parameters["population"]
-        self.gdppc = self.parameters["gdppc"]
+        if self.scenario_dim_letter is None:
+            self.pop = self.parameters["population"]
+            self.gdppc = self.parameters["gdppc"]
+            historic_selector = {"t": self.dims["h"]}
+        else:
+            # scenario as last axis, such that it can be broadcast as trailing prediction axis
+            scenario_dims = self.dims[("t", "r", self.scenario_dim_letter)]
+            self.pop = self.parameters["population"].cast_to(scenario_dims)
+            self.gdppc = self.parameters["gdppc"].cast_to(scenario_dims)
+            n_historic = self.dims["h"].len
+            for name, parameter in (("population", self.pop), ("gdppc", self.gdppc)):
+                historic = parameter.values[:n_historic]
+                if not np.array_equal(historic, np.broadcast_to(historic[..., :1], historic.shape)):
+                    raise ValueError(
+                        f"Historic {name} differs between scenarios, which would require a "
+                        "separate historic MFA per scenario."
+                    )
+            first_scenario = self.dims[self.scenario_dim_letter].items[0]
+            historic_selector = {"t": self.dims["h"], self.scenario_dim_letter: first_scenario}
         if self.do_gdppc_accumulation:
             self.gdppc_acc = np.maximum.accumulate(self.gdppc.values, axis=0)
         self.historic_pop = fd.Parameter(dims=self.dims[("h", "r")])
         self.historic_gdppc = fd.Parameter(dims=self.dims[("h", "r")])
         self.historic_stocks_pc = fd.StockArray(dims=self.dims[self.historic_dim_letters])
-        self.stocks_pc = fd.StockArray(dims=self.dims[self.target_dim_letters])
-        self.stocks = fd.StockArray(dims=self.dims[self.target_dim_letters])
+        self.stocks_pc = fd.StockArray(dims=self.dims[self.output_dim_letters])
+        self.stocks = fd.StockArray(dims=self.dims[self.output_dim_letters])
 
-        self.historic_pop[...] = self.pop[{"t": self.dims["h"]}]
-        self.historic_gdppc[...] = self.gdppc[{"t": self.dims["h"]}]
+        self.historic_pop[...] = self.pop[historic_selector]
+        self.historic_gdppc[...] = self.gdppc[historic_selector]
         self.historic_stocks_pc[...] = self.historic_stocks / self.historic_pop
 
     def gdp_regression(self):
@@ -118,7 +155,17 @@ class StockExtrapolation:
             )
         else:
             gdppc = self.gdppc
-        gdppc = broadcast_trailing_dimensions(gdppc, prediction_out)
+        if self.scenario_dim_letter is not None:
+            # move the scenario axis behind the target dimensions before broadcasting
+            gdppc = np.moveaxis(gdppc, -1, 0)
+            gdppc = broadcast_trailing_dimensions(gdppc, np.moveaxis(prediction_out, -1, 0))
+            gdppc = np.moveaxis(gdppc, 0, -1)
+            n_scenarios = prediction_out.shape[-1]
+            historic_in = np.broadcast_to(
+                historic_in[..., np.newaxis], historic_in.shape + (n_scenarios,)
+            )
+        else:
+            gdppc = broadcast_trailing_dimensions(gdppc, prediction_out)
         n_historic = historic_in.shape[0]
 
         n_deriv = 5
@@ -151,13 +198,39 @@ class StockExtrapolation:
         for i in range(n_deriv + 5):
             gdppc[i_2025 - i, ...] = gdppc[i_2025 - i + 1, ...] * growth
 
-        extrapolation = self.stock_extrapolation_class(
-            data_to_extrapolate=historic_in,
-            predictor_values=gdppc,
-            independent_dims=self.fit_dim_idx,
-            bound_list=self.bound_list,
-        )
-        pure_prediction = extrapolation.regress()
+        if self.scenario_dim_letter is None:
+            extrapolation = self.make_extrapolation(historic_in, gdppc)
+            pure_prediction = extrapolation.regress()
+            fit_prms = extrapolation._fit_prms
+        else:
+            pure_prediction = np.zeros_like(prediction_out)
+            fit_prms = None
+            extrapolations = [
+                self.make_extrapolation(historic_in[..., i], gdppc[..., i])
+                for i in range(prediction_out.shape[-1])
+            ]
+            for scenarios in self.group_scenarios(extrapolations):
+                extrapolation = extrapolations[scenarios[0]]
+                extrapolation.regress()
+                pure_prediction[..., scenarios] = extrapolation.predict(gdppc[..., scenarios])
+                if fit_prms is None:
+                    fit_prms = np.zeros(
+                        extrapolation._fit_prms.shape[:-1]
+                        + (prediction_out.shape[-1], extrapolation.n_prms)
+                    )
+                fit_prms[..., scenarios, :] = extrapolation._fit_prms[..., np.newaxis, :]
+            add_assumption_doc(
+                type="model assumption",
+                name="Shared stock regression for scenarios with equal fit data",
+                description=(
+                    "Scenarios with the same historic stocks and historic GDP per capita, "
+                    "including the synthetic recent GDP, share one stock regression, which is "
+                    "evaluated for the GDP per capita of each of them. Its initial guess is "
+                    "computed once from the first of these scenarios; for extrapolations whose "
+                    "initial guess uses future GDP, the fit may end in a different optimum than "
+                    "in a separate run of another scenario."
+                ),
+            )
 
         if self.stock_correction == "gaussian_first_order":
             prediction_out[...] = self.gaussian_correction(historic_in, pure_prediction, n_deriv)
@@ -184,12 +257,15 @@ class StockExtrapolation:
 
         # save extrapolation data for later analysis
         self.pure_prediction = fd.FlodymArray(dims=self.stocks_pc.dims, values=pure_prediction)
-        parameter_dims: fd.DimensionSet = self.dims[self.indep_fit_dim_letters]
+        parameter_dim_letters = tuple(self.indep_fit_dim_letters)
+        if self.scenario_dim_letter is not None:
+            parameter_dim_letters += (self.scenario_dim_letter,)
+        parameter_dims: fd.DimensionSet = self.dims[parameter_dim_letters]
         parameter_names = fd.Dimension(
             name="Parameter Names", letter="p", items=extrapolation.prm_names
         )
         parameter_dims = parameter_dims.expand_by([parameter_names])
-        self.pure_parameters = fd.FlodymArray(dims=parameter_dims, values=extrapolation._fit_prms)
+        self.pure_parameters = fd.FlodymArray(dims=parameter_dims, values=fit_prms)
 
         prediction_out[:n_historic, ...] = historic_in
         self.stocks_pc.set_values(prediction_out)
@@ -197,6 +273,35 @@ class StockExtrapolation:
         # transform back to total stocks
         self.stocks[...] = self.stocks_pc * self.pop
 
+    def make_extrapolation(self, historic: np.ndarray, gdppc: np.ndarray) -> Extrapolation:
+        return self.stock_extrapolation_class(
+            data_to_extrapolate=historic,
+            predictor_values=gdppc,
+            independent_dims=self.fit_dim_idx,
+            bound_list=self.bound_list,
+            regression_mode=self.regression_mode,
+            n_workers=self.n_workers,
+            fit_cache=self.fit_cache,
+        )
+
+    @staticmethod
+    def group_scenarios(extrapolations: list[Extrapolation]) -> list[list[int]]:
+        """
+        Indices of the scenarios whose regressions are fitted to the same data, i.e. the same
+        historic stocks, historic predictor and weights, such that one fit can be evaluated for all
+        of them. The historic predictor includes the synthetic recent GDP and thereby the growth
+        after 2025. The fit of a group is started from the initial guess of its first scenario.
+        """
+        groups = {}
+        for i, extrapolation in enumerate(extrapolations):
+            key = (
+                extrapolation.data_to_extrapolate.tobytes(),
+                extrapolation.predictor_values[: extrapolation.n_historic].tobytes(),
+                extrapolation.weights.tobytes(),
+            )
+            groups.setdefault(key, []).append(i)
+        return list(groups.values())
+
     def gaussian_correction(
         self, historic: np.ndarray, prediction: np.ndarray, n: int = 5
     ) -> np.ndarray:
@@ -217,22 +322,18 @@ class StockExtrapolation:
         # offset between historic and prediction at transition point
         difference_0th = historic[last_history_idx, :] - prediction[last_history_idx, :]
 
-        def lin_fit(x, y, last_idx, n=n):
-            """Linear fit of the last n points."""
-            x_cut = np.vstack([x[last_idx - n : last_idx], np.ones(n)]).T
-            y_cut = y[last_idx - n : last_idx, :]
-            y_reshaped = y_cut.reshape(n, -1).T
-            slopes = [np.linalg.lstsq(x_cut, y_dim, rcond=None)[0][0] for y_dim in y_reshaped]
-            slopes_reshaped = np.array(slopes).reshape(y.shape[1:])
-            return slopes_reshaped
-
-        last_historic_1st = lin_fit(time, historic, last_history_idx)
-        last_prediction_1st = lin_fit(time, prediction, last_history_idx)
+        # Slopes of linear fits of the last n points. All cells share the same design matrix, so
+        # the slope is the same linear combination of the data in each cell: the first row of the
+        # pseudo-inverse. By linearity, the slope of the difference equals the difference of slopes.
+        fit_window = slice(last_history_idx - n, last_history_idx)
+        design = np.vstack([time[fit_window], np.ones(n)]).T
+        slope_weights = np.linalg.pinv(design)[0]
+        difference_slope = np.tensordot(
+            slope_weights, historic[fit_window] - prediction[fit_window], axes=1
+        )
 
         # offset of the 1st derivative at the transition point
-        difference_1st = (last_historic_1st - last_prediction_1st) / (
-            last_history_year - time[last_history_idx - 1]
-        )
+        difference_1st = difference_slope / (last_history_year - time[last_history_idx - 1])
 
         def gaussian(t, approaching_time):
             """After the approaching time, the amplitude of the gaussian has decreased to 5%."""
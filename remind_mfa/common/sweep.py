@@ -0,0 +1,310 @@
+import contextvars
+import csv
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import deepcopy
+from typing import Any, Callable, Dict, List, Optional
+
+from remind_mfa.common.base_model import RemindMFABaseModel
+from remind_mfa.common.custom_data_reader import SharedInputData
+from remind_mfa.common.file_export import atomic_write
+
+
+class SweepCfg(RemindMFABaseModel):
+
+    base_config: dict
+    """Config all variants are derived from, in the format of a single run config."""
+    matrix: Dict[str, List[Any]]
+    """
+    Values per config key, with nested keys separated by dots, e.g.
+    `customization.lifetime_model_name`. One variant is run per combination of values.
+    """
+    output_path: str
+    """Root directory of the sweep. Each variant exports to its own subdirectory."""
+    n_workers: int = 1
+    """Number of worker processes. Variants are run in the main process if 1."""
+    resume: bool = True
+    """
+    Skip variants that were completed in a previous run of the same sweep, unless their config or
+    input data have changed since.
+    """
+
+
+class SweepVariant(RemindMFABaseModel):
+
+    name: str
+    overrides: Dict[str, Any]
+    config: dict
+    config_hash: str
+    """Hash of the resolved config and the input data files, see `config_hash`."""
+
+    @property
+    def output_path(self) -> str:
+        return self.config["output_path"]
+
+    @property
+    def record_path(self) -> str:
+        return os.path.join(self.output_path, "variant.json")
+
+    def read_record(self) -> Optional[dict]:
+        if not os.path.exists(self.record_path):
+            return None
+        with open(self.record_path) as f:
+            return json.load(f)
+
+    def write_record(self, record: dict):
+        os.makedirs(self.output_path, exist_ok=True)
+        with atomic_write(self.record_path) as f:
+            json.dump(record, f, indent=1)
+
+    @property
+    def status(self) -> str:
+        """Status of the last run, or "outdated" if it was run with another config or input data."""
+        record = self.read_record()
+        if record is None:
+            return "pending"
+        if record.get("config_hash") != self.config_hash:
+            return "outdated"
+        return record["status"]
+
+    @property
+    def is_completed(self) -> bool:
+        return self.status == "completed"
+
+
+def set_nested(config: dict, key: str, value: Any):
+    *parents, last = key.split(".")
+    for parent in parents:
+        config = config.setdefault(parent, {})
+    config[last] = value
+
+
+def share_input_data(config: dict, cache_path: str) -> set[str]:
+    """
+    Sets the data cache to `cache_path` and enables shared memory parameters in the data reading
+    config, unless they are set already. Returns the keys that were filled in.
+    """
+    data_reading = config.setdefault("data_reading", {})
+    filled_keys = set()
+    if "cache_path" not in data_reading:
+        data_reading["cache_path"] = cache_path
+        filled_keys.add("cache_path")
+    if "shared_memory" not in data_reading and data_reading["cache_path"] is not None:
+        data_reading["shared_memory"] = True
+        filled_keys.add("shared_memory")
+    return filled_keys
+
+
+def log_filled_keys(filled_keys: set[str]):
+    if filled_keys:
+        keys = ", ".join(f"data_reading.{key}" for key in sorted(filled_keys))
+        logging.info(f"Set {keys} in configs where unset, to share parsed input data.")
+
+
+def variant_name(overrides: Dict[str, Any]) -> str:
+    """Name derived from the override values, such that it is the same across runs of a sweep."""
+    key = json.dumps(overrides, sort_keys=True, default=str)
+    return f"variant_{hashlib.sha256(key.encode()).hexdigest()[:12]}"
+
+
+def input_data_fingerprint(input_data_path: str) -> str:
+    """
+    Hash of the paths, sizes and modification times of all files in the input data directory,
+    which changes whenever input data is edited, without reading the files.
+    """
+    h = hashlib.sha256()
+    for directory, subdirectories, files in os.walk(input_data_path):
+        subdirectories.sort()
+        for file in sorted(files):
+            path = os.path.join(directory, file)
+            stat = os.stat(path)
+            relative_path = os.path.relpath(path, input_data_path)
+            h.update(f"{relative_path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def config_hash(config: dict, input_fingerprints: Dict[str, str]) -> str:
+    """Hash of a resolved variant config and its input data, see `input_data_fingerprint`."""
+    input_data_path = config.get("input_data_path")
+    if input_data_path is not None and input_data_path not in input_fingerprints:
+        input_fingerprints[input_data_path] = input_data_fingerprint(input_data_path)
+    key = json.dumps([config, input_fingerprints.get(input_data_path)], sort_keys=True, default=str)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def make_variants(cfg: SweepCfg) -> List[SweepVariant]:
+    variants = []
+    input_fingerprints = {}
+    filled_keys = set()
+    for values in itertools.product(*cfg.matrix.values()):
+        overrides = dict(zip(cfg.matrix.keys(), values))
+        name = variant_name(overrides)
+        config = deepcopy(cfg.base_config)
+        for key, value in overrides.items():
+            set_nested(config, key, value)
+        config["output_path"] = os.path.join(cfg.output_path, name)
+        # figures can not be shown from worker processes
+        set_nested(config, "visualization.do_show_figs", False)
+        # parsed input data is published once in the sweep directory and shared by all variants
+        filled_keys.update(share_input_data(config, os.path.join(cfg.output_path, "cache")))
+        variants.append(
+            SweepVariant(
+                name=name,
+                overrides=overrides,
+                config=config,
+                config_hash=config_hash(config, input_fingerprints),
+            )
+        )
+    log_filled_keys(filled_keys)
+    return variants
+
+
+def input_data_key(config: dict) -> str:
+    """Variants with equal keys read the same input data in the same way."""
+    key = [config.get("model_class"), config.get("input_data_path"), config.get("data_reading")]
+    return json.dumps(key, sort_keys=True, default=str)
+
+
+def init_worker(
+    publish_input_data: Optional[Callable[[dict], Any]] = None, configs: List[dict] = ()
+):
+    """
+    Sets up logging and, if given, attaches the published input data of `configs` to a
+    `SharedInputData` store which is active for the lifetime of the worker, such that all variants
+    run by the worker use the same memory maps instead of reading the data cache again.
+    """
+    logging.basicConfig(
+        format=f"%(asctime)s %(levelname)-8s [{os.getpid()}] %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    if publish_input_data is None:
+        return
+    SharedInputData().__enter__()
+    for config in configs:
+        try:
+            publish_input_data(config)
+        except Exception:
+            # the error is reported when the variant is run
+            pass
+
+
+def run_variant(variant: SweepVariant, run_model: Callable[[dict], Any]) -> dict:
+    """
+    Runs a variant and records its status, also if it fails.
+    The model runs in a new context, such that its assumption list only contains its own entries.
+    """
+    record = {
+        "name": variant.name,
+        "overrides": variant.overrides,
+        "config_hash": variant.config_hash,
+        "status": "running",
+    }
+    variant.write_record(record)
+    start = time.perf_counter()
+    try:
+        contextvars.Context().run(run_model, variant.config)
+    except Exception as error:
+        record["status"] = "failed"
+        record["error"] = f"{type(error).__name__}: {error}"
+        with open(os.path.join(variant.output_path, "error.txt"), "w") as f:
+            f.write(traceback.format_exc())
+    else:
+        record["status"] = "completed"
+    record["wall_time"] = time.perf_counter() - start
+    variant.write_record(record)
+    return record
+
+
+def write_index(cfg: SweepCfg, variants: List[SweepVariant]):
+    """Summary of all variants, with one column per matrix key."""
+    path = os.path.join(cfg.output_path, "index.csv")
+    with atomic_write(path, newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "status", "wall_time", "error", "output_path", *cfg.matrix.keys()])
+        for variant in variants:
+            record = variant.read_record() or {}
+            writer.writerow(
+                [
+                    variant.name,
+                    variant.status,
+                    record.get("wall_time", ""),
+                    record.get("error", "").split("\n")[0],
+                    variant.output_path,
+                    *variant.overrides.values(),
+                ]
+            )
+
+
+def run_sweep(
+    cfg: SweepCfg,
+    run_model: Callable[[dict], Any],
+    publish_input_data: Optional[Callable[[dict], Any]] = None,
+) -> List[dict]:
+    """
+    Runs all variants of the sweep with `run_model`, which takes a config dictionary.
+    `publish_input_data` takes a config dictionary and reads its input data without building the
+    model. If there are several workers, it is called once per distinct input data of the pending
+    variants in the main process before the workers start, such that input data is parsed and
+    published to the shared cache once instead of by every worker. Each worker then attaches the
+    published data once, see `init_worker`. The summary index is updated whenever a variant
+    finishes.
+    """
+    os.makedirs(cfg.output_path, exist_ok=True)
+    variants = make_variants(cfg)
+    if cfg.resume:
+        pending = [variant for variant in variants if not variant.is_completed]
+        n_outdated = sum(variant.status == "outdated" for variant in pending)
+        logging.info(
+            f"Skipping {len(variants) - len(pending)} completed variant(s), "
+            f"rerunning {n_outdated} outdated variant(s)."
+        )
+    else:
+        pending = variants
+    write_index(cfg, variants)
+
+    published = {}
+    if publish_input_data is not None and cfg.n_workers > 1:
+        start = time.perf_counter()
+        for variant in pending:
+            key = input_data_key(variant.config)
+            if key in published:
+                continue
+            try:
+                publish_input_data(variant.config)
+                published[key] = variant.config
+            except Exception:
+                # the error is reported when the variant is run
+                pass
+        logging.info(
+            f"Input data of {len(published)} dataset(s) published in "
+            f"{time.perf_counter() - start:.1f} s."
+        )
+
+    records = []
+    if cfg.n_workers <= 1:
+        for variant in pending:
+            records.append(run_variant(variant, run_model))
+            write_index(cfg, variants)
+    else:
+        with ProcessPoolExecutor(
+            max_workers=cfg.n_workers,
+            initializer=init_worker,
+            initargs=(publish_input_data if published else None, list(published.values())),
+        ) as executor:
+            futures = [executor.submit(run_variant, variant, run_model) for variant in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                logging.info(f"Variant {record['name']} {record['status']}.")
+                records.append(record)
+                write_index(cfg, variants)
+
+    n_failed = sum(record["status"] == "failed" for record in records)
+    logging.info(f"Sweep finished: {len(records) - n_failed} completed, {n_failed} failed.")
+    return records
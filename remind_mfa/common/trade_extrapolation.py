@@ -4,8 +4,10 @@ import flodym as fd
 from remind_mfa.common.data_extrapolations import ProportionalExtrapolation
 from remind_mfa.common.data_transformations import broadcast_trailing_dimensions
 from remind_mfa.common.trade import Trade
+from remind_mfa.common.profiling import profiled
 
 
+@profiled
 def extrapolate_trade(
     historic_trade: Trade,
     future_trade: Trade,
@@ -1,12 +1,9 @@
 import flodym as fd
 import numpy as np
-
-from plotly import colors as plc
-import plotly.graph_objects as go
 from typing import TYPE_CHECKING
-import flodym.export as fde
 
 from remind_mfa.common.common_export import CommonDataExporter
+from remind_mfa.common.profiling import profiled
 
 if TYPE_CHECKING:
     from remind_mfa.plastics.plastics_model import PlasticsModel
@@ -41,11 +38,25 @@ class PlasticsDataExporter(CommonDataExporter):
         "wastetrade": "Waste trade",
     }
 
-    def visualize_results(self, model: "PlasticsModel"):
-        self.export_eol_data_by_region_and_year(mfa=model.mfa)
-        self.export_use_data_by_region_and_year(mfa=model.mfa)
-        self.export_recycling_data_by_region_and_year(mfa=model.mfa)
+    def submit_export_files(self, mfa: fd.MFASystem):
+        super().submit_export_files(mfa)
+        self.export_queue.submit(
+            self.export_path("eol_by_region_year.csv"),
+            self.export_eol_data_by_region_and_year,
+            mfa=mfa,
+        )
+        self.export_queue.submit(
+            self.export_path("use_by_region_year.csv"),
+            self.export_use_data_by_region_and_year,
+            mfa=mfa,
+        )
+        self.export_queue.submit(
+            self.export_path("recycling_by_region_year.csv"),
+            self.export_recycling_data_by_region_and_year,
+            mfa=mfa,
+        )
 
+    def visualize_results(self, model: "PlasticsModel"):
         if self.cfg.production["do_visualize"]:
             self.visualize_production(mfa=model.mfa)
 
@@ -56,6 +67,7 @@ class PlasticsDataExporter(CommonDataExporter):
             self.visualize_sankey(mfa=model.mfa)
         self.stop_and_show()
 
+    @profiled
     def visualize_production(self, mfa: fd.MFASystem):
         ap_modeled = self.plotter_class(
             array=mfa.stocks["in_use"].inflow.sum_over(("r", "m", "e")),
@@ -77,7 +89,10 @@ class PlasticsDataExporter(CommonDataExporter):
         )
         self.plot_and_save_figure(ap_historic, "production.png")
 
+    @profiled
     def visualize_stock(self, mfa: fd.MFASystem, subplots_by_good=False):
+        from plotly import colors as plc
+
         per_capita = self.cfg.use_stock["per_capita"]
 
         stock = mfa.stocks["in_use"].stock * 1000 * 1000
@@ -174,7 +189,11 @@ class PlasticsDataExporter(CommonDataExporter):
             do_plot=False,
         )
 
+    @profiled
     def visualize_sankey(self, mfa: fd.MFASystem):
+        import plotly.graph_objects as go
+        import flodym.export as fde
+
         # Define colors for each stage
         production_color = "#EDC948"
         use_color = "#9EC3D5"
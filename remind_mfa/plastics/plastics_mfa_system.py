@@ -5,11 +5,14 @@ import numpy as np
 from remind_mfa.common.stock_extrapolation import StockExtrapolation
 from remind_mfa.common.common_cfg import PlasticsCfg
 from remind_mfa.common.data_transformations import Bound, BoundList
+from remind_mfa.common.common_mfa_system import ParameterDict
+from remind_mfa.common.profiling import profile_stage
 
 
 class PlasticsMFASystem(fd.MFASystem):
 
     cfg: Optional[PlasticsCfg] = None
+    parameters: ParameterDict
 
     def compute(self):
         """
@@ -20,7 +23,8 @@ class PlasticsMFASystem(fd.MFASystem):
         self.transfer_to_simple_stock()
         self.compute_flows()
         self.compute_other_stocks()
-        self.check_mass_balance()
+        with profile_stage("check_mass_balance"):
+            self.check_mass_balance()
         self.check_flows(raise_error=False)
 
     def compute_historic_stock(self):
@@ -50,6 +54,9 @@ class PlasticsMFASystem(fd.MFASystem):
             parameters=self.parameters,
             stock_extrapolation_class=self.cfg.customization.stock_extrapolation_class,
             bound_list=bound_list,
+            regression_mode=self.cfg.customization.regression_mode,
+            n_workers=self.cfg.customization.n_regression_workers,
+            fit_cache=self.cfg.customization.fit_cache,
         )
         in_use_stock = stock_handler.stocks
         self.stocks["in_use_dsm"].stock[...] = in_use_stock
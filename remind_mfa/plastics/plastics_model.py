@@ -1,6 +1,8 @@
-import os
+import flodym as fd
 
 from remind_mfa.common.common_cfg import GeneralCfg
+from remind_mfa.common.custom_data_reader import CustomDataReader
+from remind_mfa.common.profiling import profile_stage, profiled
 from .plastics_mfa_system import PlasticsMFASystem
 from .plastics_export import PlasticsDataExporter
 from .plastics_definition import get_definition
@@ -18,40 +20,39 @@ class PlasticsModel:
         )
         self.init_mfa()
 
-    def init_mfa(self):
+    @staticmethod
+    def make_data_reader(cfg: GeneralCfg, definition: fd.MFADefinition) -> CustomDataReader:
+        return CustomDataReader(
+            input_data_path=cfg.input_data_path,
+            definition=definition,
+            cfg=cfg.data_reading,
+            allow_missing_values=True,
+            allow_extra_values=False,
+        )
 
-        dimension_map = {
-            "Time": "time_in_years",
-            "Historic Time": "historic_years",
-            "Element": "elements",
-            "Region": "regions",
-            "Material": "materials",
-            "Good": "goods_in_use",
-            "Intermediate": "intermediate_products",
-            "Scenario": "scenarios",
-        }
-
-        dimension_files = {}
-        for dimension in self.definition.dimensions:
-            dimension_filename = dimension_map[dimension.name]
-            dimension_files[dimension.name] = os.path.join(
-                self.cfg.input_data_path, "dimensions", f"{dimension_filename}.csv"
-            )
-
-        parameter_files = {}
-        for parameter in self.definition.parameters:
-            parameter_files[parameter.name] = os.path.join(
-                self.cfg.input_data_path, "datasets", f"{parameter.name}.csv"
-            )
-        self.mfa = PlasticsMFASystem.from_csv(
-            definition=self.definition,
-            dimension_files=dimension_files,
-            parameter_files=parameter_files,
-            allow_missing_parameter_values=True,
+    @classmethod
+    def publish_input_data(cls, cfg: GeneralCfg):
+        """Reads the input data into the data cache, without building the model."""
+        definition = get_definition(cfg)
+        cls.make_data_reader(cfg, definition).publish(definition)
+
+    @profiled
+    def init_mfa(self):
+        data_reader = self.make_data_reader(self.cfg, self.definition)
+        self.mfa = PlasticsMFASystem.from_data_reader(
+            definition=self.definition, data_reader=data_reader
         )
         self.mfa.cfg = self.cfg
 
     def run(self):
-        self.mfa.compute()
-        self.data_writer.export_mfa(mfa=self.mfa)
-        self.data_writer.visualize_results(model=self)
+        with profile_stage("compute"):
+            self.mfa.compute()
+        # export files and saved figures are written in the background during the visualization
+        with profile_stage("export"):
+            export = self.data_writer.export_mfa(mfa=self.mfa)
+        with profile_stage("visualize"):
+            self.data_writer.visualize_results(model=self)
+        with profile_stage("write_export"):
+            export.result()
+        with profile_stage("render_figures"):
+            self.data_writer.wait_for_figures()
@@ -1,12 +1,10 @@
 import numpy as np
-from plotly import colors as plc
-import plotly.graph_objects as go
 import flodym as fd
 from typing import TYPE_CHECKING
-import flodym.export as fde
 
 from remind_mfa.common.common_export import CommonDataExporter
 from remind_mfa.common.common_cfg import SteelVisualizationCfg
+from remind_mfa.common.profiling import profiled
 
 if TYPE_CHECKING:
     from remind_mfa.steel.steel_model import SteelModel
@@ -65,7 +63,10 @@ class SteelDataExporter(CommonDataExporter):
             self.visualize_extrapolation(model=model)
         self.stop_and_show()
 
+    @profiled
     def visualize_trade(self, mfa: fd.MFASystem):
+        from plotly import colors as plc
+
         linecolor_dims = {
             "intermediate": None,
             "indirect": "Good",
@@ -108,6 +109,7 @@ class SteelDataExporter(CommonDataExporter):
             fig = ap_exports.plot()
             self.plot_and_save_figure(ap_exports, f"trade_{name}.png", do_plot=False)
 
+    @profiled
     def visualize_consumption(self, mfa: fd.MFASystem):
         consumption = mfa.stocks["in_use"].inflow
         good_dim = consumption.dims.index("g")
@@ -124,6 +126,7 @@ class SteelDataExporter(CommonDataExporter):
         fig = ap.plot()
         self.plot_and_save_figure(ap, "consumption.png", do_plot=False)
 
+    @profiled
     def visualize_gdppc(self, mfa: fd.MFASystem, change=False, per_capita=False):
         gdppc = mfa.parameters["gdppc"]
         if not per_capita:
@@ -145,7 +148,11 @@ class SteelDataExporter(CommonDataExporter):
             fig.update_yaxes(type="log")
             self.plot_and_save_figure(ap, "gdppc.png", do_plot=False)
 
+    @profiled
     def visualize_sankey(self, mfa: fd.MFASystem):
+        import plotly.graph_objects as go
+        import flodym.export as fde
+
         good_colors = [f"hsl({190 + 10 *i},40,{77-5*i})" for i in range(4)]
         production_color = "hsl(50,40,70)"
         scrap_color = "hsl(120,40,70)"
@@ -219,6 +226,7 @@ class SteelDataExporter(CommonDataExporter):
 
         self._show_and_save_plotly(fig, name="sankey")
 
+    @profiled
     def visualize_production_consumption(self, mfa: fd.MFASystem, regional=True):
         flw = mfa.flows
         production = flw["bof_production => forming"] + flw["eaf_production => forming"]
@@ -250,6 +258,7 @@ class SteelDataExporter(CommonDataExporter):
 
         self.plot_and_save_figure(plotter, f"production_{name_str}.png", do_plot=False)
 
+    @profiled
     def visualize_production(self, mfa: fd.MFASystem, regional=True):
         flw = mfa.flows
         production = flw["bof_production => forming"] + flw["eaf_production => forming"]
@@ -270,10 +279,12 @@ class SteelDataExporter(CommonDataExporter):
 
         self.plot_and_save_figure(ap_production, f"production_{name_str}.png")
 
+    @profiled
     def visualize_use_stock(self, mfa: fd.MFASystem, subplots_by_good=False):
         subplot_dim = "Good" if subplots_by_good else None
         super().visualize_use_stock(mfa, stock=mfa.stocks["in_use"].stock, subplot_dim=subplot_dim)
 
+    @profiled
     def visualize_scrap_demand_supply(self, mfa: fd.MFASystem, regional=True):
 
         subplot_dim, summing_func, name_str = self._get_regional_vs_global_params(regional)
@@ -338,6 +349,7 @@ class SteelDataExporter(CommonDataExporter):
 
         self.plot_and_save_figure(ap, f"scrap_demand_supply_{name_str}.png")
 
+    @profiled
     def visualize_sector_splits(self, mfa: fd.MFASystem, regional: bool = True):
 
         subplot_dim, summing_func, name_str = self._get_regional_vs_global_params(regional)
@@ -373,6 +385,7 @@ class SteelDataExporter(CommonDataExporter):
             name_str = "global"
         return subplot_dim, summing_func, name_str
 
+    @profiled
     def visualize_extrapolation(self, model: "SteelModel"):
         mfa = model.future_mfa
         per_capita = True  # TODO see where this shold go
@@ -417,7 +430,8 @@ class SteelDataExporter(CommonDataExporter):
             line_label="Historic + Modelled Future",
         )
 
-        pure_stock = model.stock_handler.pure_prediction.sum_over(other_dimletters)
+        pure_stock = model.stock_handler.pure_prediction[{"s": model.scenario}]
+        pure_stock = pure_stock.sum_over(other_dimletters)
 
         # extrapolation
         color = ["red"]
@@ -467,7 +481,7 @@ class SteelDataExporter(CommonDataExporter):
         ]
         array.to_df().to_csv("data/steel/input/datasets/fixed_in_use_outflow.csv")
 
-    def export_mfa(self, mfa):
-        super().export_mfa(mfa)
+    def submit_export_files(self, mfa: fd.MFASystem):
+        super().submit_export_files(mfa)
         if self.do_export.future_input:
-            self.write_for_inflow_driven(mfa)
+            self.export_queue.submit("data/steel/input/datasets", self.write_for_inflow_driven, mfa)
@@ -1,11 +1,14 @@
 import flodym as fd
 import numpy as np
 from enum import Enum
+from typing import Optional
 
 from remind_mfa.common.trade import TradeSet
 from remind_mfa.common.trade_extrapolation import extrapolate_trade
 from remind_mfa.common.price_driven_trade import PriceDrivenTrade
 from remind_mfa.common.common_mfa_system import CommonMFASystem
+from remind_mfa.common.common_cfg import SteelCfg
+from remind_mfa.common.profiling import profile_stage
 
 
 class SteelMode(str, Enum):
@@ -16,6 +19,7 @@ class SteelMode(str, Enum):
 class SteelMFASystem(CommonMFASystem):
 
     mode: SteelMode
+    cfg: Optional[SteelCfg] = None
 
     def compute(self, stock_projection: fd.FlodymArray, historic_trade: TradeSet):
         """
@@ -25,7 +29,8 @@ class SteelMFASystem(CommonMFASystem):
         self.compute_trade(historic_trade)
         self.compute_flows()
         self.compute_other_stocks()
-        self.check_mass_balance()
+        with profile_stage("check_mass_balance"):
+            self.check_mass_balance()
         self.check_flows(raise_error=False)
         # self.update_price_elastic()
 
@@ -50,7 +55,10 @@ class SteelMFASystem(CommonMFASystem):
         price = fd.FlodymArray(dims=self.dims["t", "r"])
         price[...] = 500.0
         # price.values[131:201,2] = np.minimum(800., np.linspace(500, 2000, 70))
-        model = PriceDrivenTrade(dims=self.trade_set["intermediate"].exports.dims)
+        model = PriceDrivenTrade(
+            dims=self.trade_set["intermediate"].exports.dims,
+            solver=self.cfg.customization.trade_solver,
+        )
         model.calibrate(
             demand=self.flows["ip_market => fabrication"][2022],
             price=price[2022],
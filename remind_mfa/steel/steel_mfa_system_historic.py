@@ -5,6 +5,7 @@ import flodym as fd
 from remind_mfa.common.data_blending import blend
 from remind_mfa.common.assumptions_doc import add_assumption_doc
 from remind_mfa.common.common_mfa_system import CommonMFASystem
+from remind_mfa.common.profiling import profile_stage
 
 
 class SteelMFASystemHistoric(CommonMFASystem):
@@ -18,7 +19,8 @@ class SteelMFASystemHistoric(CommonMFASystem):
         self.calc_sector_split()
         self.compute_flows()
         self.compute_in_use_stock()
-        self.check_mass_balance()
+        with profile_stage("check_mass_balance"):
+            self.check_mass_balance()
         self.check_flows(raise_error=False)
 
     def compute_flows(self):
@@ -1,6 +1,7 @@
 import numpy as np
 import flodym as fd
 from copy import deepcopy
+from typing import Optional
 
 from remind_mfa.common.data_blending import blend
 from remind_mfa.common.common_cfg import GeneralCfg
@@ -15,18 +16,47 @@ from remind_mfa.steel.steel_mfa_system_historic import SteelMFASystemHistoric
 from remind_mfa.steel.steel_definition import get_definition, SteelMFADefinition
 from remind_mfa.common.assumptions_doc import add_assumption_doc
 from remind_mfa.common.common_mfa_system import CommonMFASystem
+from remind_mfa.common.profiling import profile_stage, profiled
 
 
 class SteelModel:
 
     def __init__(self, cfg: GeneralCfg):
         self.cfg = cfg
+        self.definition_future = self.get_future_definition(self.cfg)
+        self.read_data(self.definition_future)
+
+    @staticmethod
+    def get_future_definition(cfg: GeneralCfg) -> SteelMFADefinition:
+        stock_driven = cfg.customization.mode == "stock_driven"
+        return get_definition(cfg, historic=False, stock_driven=stock_driven)
+
+    @staticmethod
+    def make_data_reader(cfg: GeneralCfg, definition: SteelMFADefinition) -> CustomDataReader:
+        return CustomDataReader(
+            input_data_path=cfg.input_data_path,
+            definition=definition,
+            cfg=cfg.data_reading,
+        )
+
+    @classmethod
+    def publish_input_data(cls, cfg: GeneralCfg):
+        """Reads the input data into the data cache, without building the model."""
+        definition = cls.get_future_definition(cfg)
+        cls.make_data_reader(cfg, definition).publish(definition)
 
     def run(self):
-        stock_driven = self.cfg.customization.mode == "stock_driven"
-        self.definition_future = get_definition(self.cfg, historic=False, stock_driven=stock_driven)
-        self.read_data(self.definition_future)
-        self.modify_parameters()
+        """
+        Runs the model in stages, each of which is loaded from a checkpoint if one exists for its
+        inputs and config (see `CheckpointStore`).
+        """
+        customization = self.cfg.customization
+        stock_driven = customization.mode == "stock_driven"
+        checkpoints = self.cfg.checkpoints
+        key = checkpoints.data_key(self.dims, self.parameters)
+        self.parameters, key = checkpoints.run_stage(
+            "parameters", self.get_modified_parameters, key, {"mode": customization.mode}
+        )
         self.data_writer = SteelDataExporter(
             cfg=self.cfg.visualization,
             do_export=self.cfg.do_export,
@@ -34,28 +64,77 @@ class SteelModel:
         )
         if stock_driven:
             self.definition_historic = get_definition(self.cfg, historic=True, stock_driven=False)
-            self.historic_mfa = self.make_mfa(historic=True)
-            self.historic_mfa.compute()
-            stock_projection = self.get_long_term_stock()
+            self.historic_mfa, key = checkpoints.run_stage(
+                "historic_mfa",
+                self.compute_historic_mfa,
+                key,
+                {"lifetime_model_name": customization.lifetime_model_name},
+            )
+            (stock_projection, self.stock_handler), key = checkpoints.run_stage(
+                "stock_projection",
+                lambda: (self.get_long_term_stock(), self.stock_handler),
+                key,
+                {
+                    "stock_extrapolation_class_name": customization.stock_extrapolation_class_name,
+                    "do_stock_extrapolation_by_category": (
+                        customization.do_stock_extrapolation_by_category
+                    ),
+                    "regression_mode": customization.regression_mode,
+                    "global_saturation_level_factor": customization.global_saturation_level_factor,
+                    "scenario": self.scenario,
+                },
+            )
             historic_trade = self.historic_mfa.trade_set
         else:
             stock_projection = None
             historic_trade = None
 
-        self.future_mfa = self.make_mfa(historic=False, mode=self.cfg.customization.mode)
-        self.future_mfa.compute(stock_projection, historic_trade)
+        self.future_mfa, key = checkpoints.run_stage(
+            "future_mfa",
+            lambda: self.compute_future_mfa(stock_projection, historic_trade),
+            key,
+            {
+                "mode": customization.mode,
+                "lifetime_model_name": customization.lifetime_model_name,
+                "trade_solver": customization.trade_solver,
+            },
+        )
 
-        self.data_writer.export_mfa(mfa=self.future_mfa)
-        self.data_writer.visualize_results(model=self)
+        # export files and saved figures are written in the background during the visualization
+        with profile_stage("export"):
+            export = self.data_writer.export_mfa(mfa=self.future_mfa)
+        with profile_stage("visualize"):
+            self.data_writer.visualize_results(model=self)
+        with profile_stage("write_export"):
+            export.result()
+        with profile_stage("render_figures"):
+            self.data_writer.wait_for_figures()
 
+    @profiled
     def read_data(self, definition: SteelMFADefinition):
-        self.data_reader = CustomDataReader(
-            input_data_path=self.cfg.input_data_path,
-            definition=definition,
-        )
+        self.data_reader = self.make_data_reader(self.cfg, definition)
         self.dims = self.data_reader.read_dimensions(definition.dimensions)
         self.parameters = self.data_reader.read_parameters(definition.parameters, dims=self.dims)
 
+    def get_modified_parameters(self) -> dict[str, fd.Parameter]:
+        self.modify_parameters()
+        return self.parameters
+
+    @profiled
+    def compute_historic_mfa(self) -> SteelMFASystemHistoric:
+        historic_mfa = self.make_mfa(historic=True)
+        historic_mfa.compute()
+        return historic_mfa
+
+    @profiled
+    def compute_future_mfa(
+        self, stock_projection: Optional[fd.FlodymArray], historic_trade: Optional[TradeSet]
+    ) -> SteelMFASystem:
+        future_mfa = self.make_mfa(historic=False, mode=self.cfg.customization.mode)
+        future_mfa.compute(stock_projection, historic_trade)
+        return future_mfa
+
+    @profiled
     def modify_parameters(self):
         """Manual changes to parameters in order to match historical scrap consumption."""
 
@@ -175,6 +254,14 @@ class SteelModel:
             mode=mode,
         )
 
+    @property
+    def scenario(self) -> str:
+        """Scenario whose stock projection is used in the future MFA, by default the first."""
+        if self.cfg.customization.scenario is not None:
+            return self.cfg.customization.scenario
+        return self.dims["s"].items[0]
+
+    @profiled
     def get_long_term_stock(self) -> fd.FlodymArray:
         indep_fit_dim_letters = (
             ("g",) if self.cfg.customization.do_stock_extrapolation_by_category else ()
@@ -233,8 +320,13 @@ class SteelModel:
             ),
             indep_fit_dim_letters=indep_fit_dim_letters,
             bound_list=bound_list,
+            regression_mode=self.cfg.customization.regression_mode,
+            n_workers=self.cfg.customization.n_regression_workers,
+            fit_cache=self.cfg.customization.fit_cache,
+            scenario_dim_letter="s",
         )
-        total_in_use_stock = self.stock_handler.stocks
+        # the stocks are projected for all scenarios, the future MFA is computed for one of them
+        total_in_use_stock = self.stock_handler.stocks[{"s": self.scenario}]
 
         # scale back stocks and gdp
         total_in_use_stock = total_in_use_stock * self.parameters["saturation_level_factor"]
@@ -256,6 +348,7 @@ class SteelModel:
             data_to_extrapolate=historic_stocks_pc.values,
             predictor_values=gdppc.values,
             independent_dims=(),
+            fit_cache=self.cfg.customization.fit_cache,
         )
         multi_dim_extrapolation.regress()
         saturation_level = multi_dim_extrapolation.fit_prms[0]
@@ -264,7 +357,7 @@ class SteelModel:
             high_stock_sector_split = self.get_high_stock_sector_split()
             saturation_level = saturation_level * high_stock_sector_split.values
 
-        saturation_level_factor = 0.75
+        saturation_level_factor = self.cfg.customization.global_saturation_level_factor
         add_assumption_doc(
             type="ad-hoc fix",
             name="saturation level factor",
@@ -4,11 +4,13 @@ import flodym as fd
 import sys
 
 from remind_mfa.common.common_cfg import GeneralCfg
+from remind_mfa.common.sweep import SweepCfg, run_sweep
+from remind_mfa.common.combined_run import CombinedRunCfg, run_combined
+from remind_mfa.common.profiling import profile_run
 from remind_mfa.plastics.plastics_model import PlasticsModel
 from remind_mfa.steel.steel_model import SteelModel
 from remind_mfa.cement.cement_model import CementModel
 
-
 models = {
     "plastics": PlasticsModel,
     "steel": SteelModel,
@@ -31,10 +33,34 @@ def init_model(cfg: dict) -> fd.MFASystem:
 
 
 def calculate_model(model_config):
-    mfa = init_model(cfg=model_config)
-    logging.info(f"{type(mfa).__name__} instance created.")
-    mfa.run()
-    logging.info("Model computations completed.")
+    cfg = GeneralCfg.from_model_class(**model_config)
+    with profile_run(cfg.profiling, output_path=cfg.output_path):
+        mfa = init_model(cfg=model_config)
+        logging.info(f"{type(mfa).__name__} instance created.")
+        mfa.run()
+        logging.info("Model computations completed.")
+
+
+def publish_input_data(model_config):
+    """Reads the input data of a model into the data cache, without building the model."""
+    cfg = GeneralCfg.from_model_class(**model_config)
+    models[cfg.model_class].publish_input_data(cfg)
+
+
+def calculate_sweep(sweep_config):
+    if isinstance(sweep_config["base_config"], str):
+        sweep_config["base_config"] = get_model_config(sweep_config["base_config"])
+    cfg = SweepCfg(**sweep_config)
+    run_sweep(cfg, run_model=calculate_model, publish_input_data=publish_input_data)
+
+
+def calculate_combined(combined_config):
+    combined_config["configs"] = [
+        get_model_config(config) if isinstance(config, str) else config
+        for config in combined_config["configs"]
+    ]
+    cfg = CombinedRunCfg(**combined_config)
+    run_combined(cfg, run_model=calculate_model, publish_input_data=publish_input_data)
 
 
 def run_remind_mfa(cfg_file: str):
@@ -45,7 +71,12 @@ def run_remind_mfa(cfg_file: str):
     )
 
     model_config = get_model_config(cfg_file)
-    calculate_model(model_config)
+    if "matrix" in model_config:
+        calculate_sweep(model_config)
+    elif "configs" in model_config:
+        calculate_combined(model_config)
+    else:
+        calculate_model(model_config)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+"""
+Benchmarks the models end to end and per stage on synthetic input data at several scales.
+Input data is generated with `generate_synthetic_data.py` on first use and reused afterwards.
+Each run is done in a fresh process with profiling enabled (see `remind_mfa.common.profiling`),
+and the results are stored in a JSON file named after the current commit, such that they can be
+compared across commits.
+
+Examples:
+    python scripts/benchmark.py --models steel cement --regions 12 21 50 200
+    python scripts/benchmark.py --compare data/benchmarks/results/abc1234.json \
+        data/benchmarks/results/def5678.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from multiprocessing import get_context
+
+import flodym as fd
+import numpy as np
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_PATH)
+
+import generate_synthetic_data
+from run_remind_mfa import calculate_model, get_model_config
+
+
+def git_label() -> str:
+    """Short hash of the current commit, marked if there are uncommitted changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_PATH,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    is_dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], cwd=REPO_PATH).returncode != 0
+    return f"{commit}-dirty" if is_dirty else commit
+
+
+def disable_visualization(config: dict):
+    for key, value in config.items():
+        if isinstance(value, dict):
+            disable_visualization(value)
+        elif key in ("do_visualize", "do_show_figs", "do_save_figs"):
+            config[key] = False
+
+
+def input_data_path(args: argparse.Namespace, model: str, n_regions: int) -> str:
+    path = os.path.join(args.output_path, "input", f"{model}_r{n_regions}_s{args.seed}")
+    if not os.path.exists(os.path.join(path, "datasets")):
+        data_args = generate_synthetic_data.get_parser().parse_args(
+            [model, path, "--regions", str(n_regions), "--seed", str(args.seed)]
+        )
+        generate_synthetic_data.generate(model, path, data_args)
+    return path
+
+
+def run_config(args: argparse.Namespace, model: str, n_regions: int) -> dict:
+    config = deepcopy(get_model_config(os.path.join(REPO_PATH, "config", f"{model}.yml")))
+    config["input_data_path"] = input_data_path(args, model, n_regions)
+    config["output_path"] = os.path.join(args.output_path, "runs", f"{model}_r{n_regions}")
+    config.pop("checkpoint_path", None)
+    config["do_export"] = {"csv": args.export, "pickle": False}
+    disable_visualization(config["visualization"])
+    config["profiling"] = {
+        "enabled": True,
+        "trace_allocations": args.trace_allocations,
+        "log_summary": False,
+    }
+    return config
+
+
+def run_benchmark(config: dict) -> dict:
+    """Runs the model in the current process and returns the summed profile per stage."""
+    calculate_model(config)
+    with open(os.path.join(config["output_path"], "profile.json")) as f:
+        profile = json.load(f)
+    stages = {}
+    for result in profile:
+        stage = stages.setdefault(result["stage"], {"calls": 0})
+        stage["calls"] += 1
+        for key, value in result.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                stage[key] = stage.get(key, 0) + value
+    return stages
+
+
+def run_benchmarks(args: argparse.Namespace) -> dict:
+    results = {
+        "label": args.label or git_label(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "flodym": getattr(fd, "__version__", "unknown"),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "runs": [],
+    }
+    for model in args.models:
+        for n_regions in args.regions:
+            config = run_config(args, model, n_regions)
+            for repetition in range(args.repeat):
+                shutil.rmtree(config["output_path"], ignore_errors=True)
+                # a fresh process per run, such that imports and memory use do not carry over
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                    stages = pool.submit(run_benchmark, config).result()
+                run = {
+                    "model": model,
+                    "regions": n_regions,
+                    "repetition": repetition,
+                    "wall_time": stages["run"]["wall_time"],
+                    "stages": stages,
+                }
+                print(
+                    f"{model:<10} {n_regions:>5} regions  run {repetition + 1}/{args.repeat}  "
+                    f"{run['wall_time']:8.2f} s"
+                )
+                results["runs"].append(run)
+    return results
+
+
+def best_times(results: dict) -> dict:
+    """Minimum wall time over repetitions per model, number of regions and stage."""
+    times = {}
+    for run in results["runs"]:
+        for stage, profile in run["stages"].items():
+            key = (run["model"], run["regions"], stage)
+            times[key] = min(times.get(key, np.inf), profile["wall_time"])
+    return times
+
+
+def compare(paths: list[str]):
+    """Prints the wall times of each stage side by side, relative to the first results file."""
+    all_results = []
+    for path in paths:
+        with open(path) as f:
+            all_results.append(json.load(f))
+    all_times = [best_times(results) for results in all_results]
+    keys = list(dict.fromkeys(key for times in all_times for key in times))
+
+    header = f"{'model':<10} {'regions':>7}  {'stage':<50}"
+    header += "".join(f" {results['label']:>16}" for results in all_results)
+    print(header)
+    for model, n_regions, stage in keys:
+        line = f"{model:<10} {n_regions:>7}  {stage:<50}"
+        reference = all_times[0].get((model, n_regions, stage))
+        for times in all_times:
+            time = times.get((model, n_regions, stage))
+            if time is None:
+                line += f" {'-':>16}"
+            elif reference is None or times is all_times[0]:
+                line += f" {time:>15.3f}s"
+            else:
+                line += f" {time:>8.3f}s {time / reference:>5.2f}x"
+        print(line)
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark the models on synthetic data.")
+    parser.add_argument("--models", nargs="+", default=generate_synthetic_data.MODELS)
+    parser.add_argument("--regions", nargs="+", type=int, default=[12, 21, 50, 200])
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per model and scale.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output-path",
+        default=os.path.join(REPO_PATH, "data", "benchmarks"),
+        help="Directory for synthetic input data, model output and results.",
+    )
+    parser.add_argument("--label", help="Name of the results file. Defaults to the commit.")
+    parser.add_argument(
+        "--no-export",
+        dest="export",
+        action="store_false",
+        help="Skip the CSV export of the results.",
+    )
+    parser.add_argument(
+        "--trace-allocations",
+        action="store_true",
+        help="Also record allocated memory, which slows down the runs considerably.",
+    )
+    parser.add_argument(
+        "--compare",
+        nargs="+",
+        metavar="RESULTS",
+        help="Compare results files instead of running benchmarks.",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    if args.compare:
+        compare(args.compare)
+        sys.exit()
+    results = run_benchmarks(args)
+    results_path = os.path.join(args.output_path, "results", f"{results['label']}.json")
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    with open(results_path, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"Results written to {results_path}.")
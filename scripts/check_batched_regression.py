@@ -0,0 +1,151 @@
+"""
+Checks that the batched regression (`regression_mode="batched"`, see `batched_least_squares`)
+gives the same fits as the per-slice solver calls of `regression_mode="sequential"`.
+Each extrapolation class is fitted with and without a fixed saturation level on synthetic stock
+per capita data of many regions, which is generated from a seeded random number generator.
+For each region, the batched fit passes if
+- its cost (weighted sum of squared residuals) does not exceed the sequential one by more than
+  `cost_tol` relative, and
+- if both costs are equal within `cost_tol`, the fitted historic values differ by at most
+  `value_tol` relative to the largest historic value of the region. Differences of up to 2e-6
+  were found on the steel data, as both solvers stop at their own tolerances.
+Regions where the batched solver finds a lower cost, i.e. the sequential one stopped at a worse
+local optimum, are counted but do not fail the check.
+Exits with an error if any region fails.
+
+Example:
+    python scripts/check_batched_regression.py --regions 50 --value-tol 1e-5
+"""
+
+import argparse
+import os
+import sys
+import warnings
+
+import flodym as fd
+import numpy as np
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_PATH)
+
+from remind_mfa.common.data_extrapolations import (
+    ExponentialSaturationExtrapolation,
+    LogSigmoidExtrapolation,
+    PehlExtrapolation,
+    SigmoidExtrapolation,
+)
+from remind_mfa.common.data_transformations import Bound, BoundList
+
+EXTRAPOLATION_CLASSES = [
+    LogSigmoidExtrapolation,
+    SigmoidExtrapolation,
+    ExponentialSaturationExtrapolation,
+    PehlExtrapolation,
+]
+
+N_YEARS = 201
+N_HISTORIC = 123
+
+
+def synthetic_data(n_regions: int, seed: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """GDP per capita, noisy sigmoid stock per capita over the historic years and saturation."""
+    rng = np.random.default_rng(seed)
+    log_gdppc = np.linspace(np.log(500.0), np.log(60000.0), N_YEARS)
+    gdppc = np.exp(log_gdppc)[:, np.newaxis] * rng.uniform(0.3, 2.0, (1, n_regions))
+    saturation_level = rng.uniform(5.0, 15.0, n_regions)
+    historic_gdppc = gdppc[:N_HISTORIC]
+    stock_pc = saturation_level / (1.0 + np.exp(-3.0 * (np.log10(historic_gdppc) - 3.8)))
+    stock_pc *= 1.0 + 0.05 * rng.standard_normal((N_HISTORIC, n_regions))
+    return gdppc, stock_pc, saturation_level
+
+
+def saturation_bounds(saturation_level: np.ndarray) -> BoundList:
+    dims = fd.DimensionSet(
+        dim_list=[
+            fd.Dimension(
+                name="Region",
+                letter="r",
+                items=[f"region_{i}" for i in range(len(saturation_level))],
+            )
+        ]
+    )
+    bound = Bound(
+        var_name="saturation_level",
+        lower_bound=saturation_level,
+        upper_bound=saturation_level,
+        dims=dims,
+    )
+    return BoundList(bound_list=[bound], target_dims=dims)
+
+
+def fit(extrapolation_class, mode: str, gdppc, stock_pc, bound_list) -> np.ndarray:
+    extrapolation = extrapolation_class(
+        data_to_extrapolate=stock_pc,
+        predictor_values=gdppc,
+        independent_dims=(1,),
+        bound_list=bound_list,
+        regression_mode=mode,
+    )
+    return extrapolation.regress()[:N_HISTORIC]
+
+
+def compare(sequential: np.ndarray, batched: np.ndarray, stock_pc: np.ndarray, args) -> dict:
+    cost_sequential = np.sum((sequential - stock_pc) ** 2, axis=0)
+    cost_batched = np.sum((batched - stock_pc) ** 2, axis=0)
+    cost_diff = (cost_batched - cost_sequential) / cost_sequential
+    value_diff = np.max(np.abs(batched - sequential), axis=0) / np.max(np.abs(stock_pc), axis=0)
+    same_optimum = np.abs(cost_diff) <= args.cost_tol
+    return {
+        "max_value_diff": np.max(value_diff[same_optimum], initial=0.0),
+        "max_cost_diff": np.max(cost_diff),
+        "n_improved": int(np.sum(cost_diff < -args.cost_tol)),
+        "n_failed": int(
+            np.sum((cost_diff > args.cost_tol) | (same_optimum & (value_diff > args.value_tol)))
+        ),
+    }
+
+
+def main(args) -> int:
+    # the solvers warn about slices which stop at the iteration limit
+    warnings.simplefilter("ignore")
+    gdppc, stock_pc, saturation_level = synthetic_data(args.regions, args.seed)
+    bound_lists = {"free": BoundList(), "fixed saturation": saturation_bounds(saturation_level)}
+    print(f"{'extrapolation':<36} {'bounds':<17} {'value diff':>10} {'cost diff':>10} improved")
+    n_failed = 0
+    for extrapolation_class in EXTRAPOLATION_CLASSES:
+        for bounds_name, bound_list in bound_lists.items():
+            sequential = fit(extrapolation_class, "sequential", gdppc, stock_pc, bound_list)
+            batched = fit(extrapolation_class, "batched", gdppc, stock_pc, bound_list)
+            result = compare(sequential, batched, stock_pc, args)
+            print(
+                f"{extrapolation_class.__name__:<36} {bounds_name:<17} "
+                f"{result['max_value_diff']:10.2e} {result['max_cost_diff']:10.2e} "
+                f"{result['n_improved']:8d}"
+                + (f"  FAILED in {result['n_failed']} region(s)" if result["n_failed"] else "")
+            )
+            n_failed += result["n_failed"]
+    if n_failed:
+        print(f"Batched regression differs from sequential regression in {n_failed} case(s).")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the batched regression against the sequential one."
+    )
+    parser.add_argument("--regions", type=int, default=12, help="Number of regions.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--value-tol",
+        type=float,
+        default=1e-5,
+        help="Tolerance on fitted values, relative to the largest historic value of a region.",
+    )
+    parser.add_argument(
+        "--cost-tol",
+        type=float,
+        default=1e-8,
+        help="Tolerance on the cost of the batched fit, relative to the sequential one.",
+    )
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,63 @@
+"""
+Checks that `import run_remind_mfa` stays within a time budget and does not load the plotting
+libraries, which are only needed once a figure is made.
+Each import is timed in a fresh interpreter, and the fastest of several runs is compared to the
+budget, as the first run may include compiling and reading files into the disk cache.
+Exits with an error if the budget is exceeded or a plotting library is loaded.
+
+Example:
+    python scripts/check_import_time.py --budget 2.5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLOTTING_MODULES = ["matplotlib", "plotly", "flodym.export"]
+
+IMPORT_CODE = f"""
+import json, sys, time
+start = time.perf_counter()
+import run_remind_mfa
+duration = time.perf_counter() - start
+loaded = [m for m in {PLOTTING_MODULES} if m in sys.modules]
+print(json.dumps({{"duration": duration, "loaded": loaded}}))
+"""
+
+
+def time_import() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_CODE],
+        cwd=REPO_PATH,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(budget: float, repeat: int) -> int:
+    results = [time_import() for _ in range(repeat)]
+    duration = min(result["duration"] for result in results)
+    loaded = results[-1]["loaded"]
+    print(f"import run_remind_mfa: {duration:.3f} s (budget {budget:.3f} s, best of {repeat})")
+    failed = False
+    if duration > budget:
+        print(f"Import time exceeds the budget by {duration - budget:.3f} s.")
+        failed = True
+    if loaded:
+        print(f"Plotting modules loaded on import: {', '.join(loaded)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the import time of run_remind_mfa.")
+    parser.add_argument("--budget", type=float, default=2.5, help="Budget in seconds.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    sys.exit(main(args.budget, args.repeat))
@@ -0,0 +1,299 @@
+"""
+Generates synthetic input data for the steel, cement and plastics models, with the same
+`dimensions/` and `datasets/` layout as the actual input data. The parameters to write are taken
+from the model definitions, such that the data always matches the current model code.
+Values are random but plausible: GDP per capita grows towards saturation, historic production
+follows population and GDP, and shares and splits add up to one, such that the models run through
+and pass their mass balance checks. The data is meant for testing and benchmarking, not for
+drawing conclusions.
+
+Example:
+    python scripts/generate_synthetic_data.py steel data/synthetic/steel --regions 50
+"""
+
+import argparse
+import itertools
+import os
+import sys
+from types import SimpleNamespace
+
+import flodym as fd
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from remind_mfa.common.custom_data_reader import CustomDataReader
+from remind_mfa.cement.cement_data_reader import CementDataReader
+from remind_mfa.steel.steel_definition import get_definition as get_steel_definition
+from remind_mfa.cement.cement_definition import get_definition as get_cement_definition
+from remind_mfa.plastics.plastics_definition import get_definition as get_plastics_definition
+
+MODELS = ["steel", "cement", "plastics"]
+
+STEEL_GOODS = ["Construction", "Machinery", "Products", "Transport"]
+CEMENT_STOCK_TYPES = ["Residential", "Non-residential", "Civil engineering"]
+PLASTICS_GOODS = [
+    "Agriculture",
+    "Building and Construction",
+    "Electrical",
+    "Packaging",
+    "Transport",
+]
+PLASTICS_MATERIALS = ["PE", "PP", "PS", "PVC", "PET", "PUR", "Other"]
+
+
+def item_names(defaults: list[str], n: int, prefix: str) -> list[str]:
+    """The first `n` default names, continued with numbered names if more are requested."""
+    return defaults[:n] + [f"{prefix} {i + 1}" for i in range(len(defaults), n)]
+
+
+def normalize(values: np.ndarray, axis: int) -> np.ndarray:
+    return values / values.sum(axis=axis, keepdims=True)
+
+
+class SyntheticData:
+    """Dimension items and random number generator shared by the parameter generators."""
+
+    def __init__(
+        self,
+        definition: fd.MFADefinition,
+        items: dict[str, list],
+        seed: int,
+    ):
+        self.definition = definition
+        self.items = items
+        self.names = {dim.letter: dim.name for dim in definition.dimensions}
+        self.rng = np.random.default_rng(seed)
+
+    def n(self, letter: str) -> int:
+        return len(self.items[self.names[letter]])
+
+    def shape(self, letters: tuple) -> tuple:
+        return tuple(self.n(letter) for letter in letters)
+
+    def uniform(self, low: float, high: float, letters: tuple = ()) -> np.ndarray:
+        return self.rng.uniform(low, high, self.shape(letters))
+
+    def population(self) -> np.ndarray:
+        """Population in persons, over (t, r)."""
+        t = np.arange(self.n("t"))[:, None]
+        growth = self.uniform(0.002, 0.012, ("r",))[None, :]
+        return self.uniform(1e7, 1e8, ("r",))[None, :] * np.exp(growth * t)
+
+    def gdppc(self) -> np.ndarray:
+        """GDP per capita, growing exponentially until it approaches a saturation level."""
+        t = np.arange(self.n("t"))[:, None]
+        gdppc = 500.0 * np.exp(self.uniform(0.015, 0.03, ("r",))[None, :] * t)
+        saturation = self.uniform(3e4, 8e4, ("r",))[None, :]
+        return np.minimum(gdppc, saturation * (1.0 - np.exp(-gdppc / 5e4)))
+
+    def noise(self, letters: tuple, scale: float = 0.1) -> np.ndarray:
+        return (1.0 + scale * self.rng.standard_normal(self.shape(letters))).clip(0.5)
+
+
+def steel_values(data: SyntheticData) -> dict[str, np.ndarray]:
+    nh = data.n("h")
+    population = data.population()
+    gdppc = data.gdppc()
+    production_total = population[:nh] * gdppc[:nh] / 1e4 * 0.2 * data.noise(("h", "r"))
+    production = production_total[:, :, None] * normalize(data.uniform(0.5, 1, ("r", "i")), -1)
+    lifetime_mean = data.uniform(15, 60, ("r", "g"))
+    return {
+        "forming_yield": data.uniform(0.9, 0.97, ("i",)),
+        "fabrication_yield": data.uniform(0.8, 0.95, ("g",)),
+        "recovery_rate": data.uniform(0.5, 0.9, ("g",)),
+        "good_to_intermediate_distribution": normalize(data.uniform(0.1, 1, ("g", "i")), 1),
+        "population": population,
+        "gdppc": gdppc,
+        "lifetime_mean": lifetime_mean,
+        "lifetime_std": 0.3 * lifetime_mean,
+        "sector_split_low": normalize(data.uniform(0.2, 1, ("g",)), 0),
+        "sector_split_medium": normalize(data.uniform(0.2, 1, ("g",)), 0),
+        "sector_split_high": normalize(data.uniform(0.2, 1, ("g",)), 0),
+        "secsplit_gdppc_low": 3000.0,
+        "secsplit_gdppc_high": 30000.0,
+        "max_scrap_share_base_model": 0.6,
+        "scrap_in_bof_rate": 0.2,
+        "forming_losses": 0.05,
+        "fabrication_losses": 0.1,
+        "production_yield": 0.95,
+        "saturation_level_factor": data.uniform(0.8, 1.2, ("r",)),
+        "stock_growth_speed_factor": data.uniform(0.8, 1.2, ("r",)),
+        "scrap_consumption": 0.3 * production_total,
+        "production_by_intermediate": production,
+        "intermediate_imports": 0.1 * production * data.uniform(0.5, 1.5, ("h", "r", "i")),
+        "intermediate_exports": 0.1 * production * data.uniform(0.5, 1.5, ("h", "r", "i")),
+        "indirect_imports": 0.05
+        * production_total[:, :, None]
+        * data.uniform(0.1, 0.4, ("h", "r", "g")),
+        "indirect_exports": 0.05
+        * production_total[:, :, None]
+        * data.uniform(0.1, 0.4, ("h", "r", "g")),
+        "scrap_imports": 0.02 * production_total,
+        "scrap_exports": 0.02 * production_total,
+    }
+
+
+def cement_values(data: SyntheticData) -> dict[str, np.ndarray]:
+    nh = data.n("h")
+    population = data.population()
+    gdppc = data.gdppc()
+    # cement consumption per capita rises with GDP per capita towards 0.2 to 0.5 t/yr
+    per_capita = data.uniform(0.2, 0.5, ("r",))[None, :] * (1.0 - np.exp(-gdppc[:nh] / 1e4))
+    production = population[:nh] * per_capita * data.noise(("h", "r"))
+    lifetime_mean = data.uniform(40, 80, ("r", "s"))
+    return {
+        "cement_production": production,
+        "cement_trade": 0.05 * production * data.uniform(-1, 1, ("h", "r")),
+        "clinker_ratio": np.broadcast_to(data.uniform(0.65, 0.85, ("r",)), data.shape(("t", "r"))),
+        "cement_ratio": 0.15,
+        "use_split": normalize(data.uniform(0.2, 1, ("s",)), 0),
+        "historic_use_lifetime_mean": np.broadcast_to(lifetime_mean, data.shape(("h", "r", "s"))),
+        "future_use_lifetime_mean": np.broadcast_to(lifetime_mean, data.shape(("t", "r", "s"))),
+        "population": population,
+        "gdppc": gdppc,
+    }
+
+
+def plastics_values(data: SyntheticData) -> dict[str, np.ndarray]:
+    nh = data.n("h")
+    population = data.population()
+    gdppc = data.gdppc()
+    # production in Mt, up to about 20 kg per capita and year
+    per_capita = 2e-8 * (1.0 - np.exp(-gdppc[:nh] / 2e4))
+    good_split = normalize(data.uniform(0.2, 1, ("g",)), 0)
+    production = (
+        (population[:nh] * per_capita)[:, :, None] * good_split * data.noise(("h", "r", "g"))
+    )
+    lifetime_mean = data.uniform(2, 30, ("r", "g"))
+    # waste trade follows global production per good with a delay of 20 years, such that it
+    # stays below the waste collected in each region
+    t_lagged = np.arange(data.n("t")) - 20
+    waste_trade = production.sum(axis=1)[np.clip(t_lagged, 0, nh - 1)]
+    waste_trade[t_lagged < 0] = 0.0
+
+    # end-of-life treatment rates, which must not add up to more than one
+    treatment = normalize(data.rng.uniform(0.2, 1, (*data.shape(("t", "r", "m")), 4)), -1)
+    t = np.linspace(0, 1, data.n("t"))[:, None, None]
+    rates = {
+        "mechanical_recycling_rate": treatment[..., 0] * 0.4,
+        "chemical_recycling_rate": treatment[..., 1] * 0.1 * t,
+        "incineration_rate": treatment[..., 2] * 0.5,
+    }
+    # captured carbon is distributed to materials by their virgin production shares, so other
+    # elements are only balanced if the carbon content is the same for all materials
+    carbon_content = np.full(data.shape(("m",)), data.uniform(0.6, 0.9))
+    return {
+        "collection_rate": data.uniform(0.5, 0.95, ("t", "r", "m")),
+        **rates,
+        "solvent_recycling_rate": np.zeros(data.shape(("t", "r", "m"))),
+        "landfill_rate": 1.0 - sum(rates.values()),
+        "wasteimport_rate": normalize(data.uniform(0.2, 1, ("t", "r", "g")), 1),
+        "wasteexport_rate": normalize(data.uniform(0.2, 1, ("t", "r", "g")), 1),
+        "bio_production_rate": 0.1 * t * data.uniform(0.5, 1, ("t", "r", "m")),
+        "daccu_production_rate": 0.05 * t * data.uniform(0.5, 1, ("t", "r", "m")),
+        "mechanical_recycling_yield": data.uniform(0.7, 0.9, ("t", "r", "m")),
+        "reclmech_loss_uncontrolled_rate": data.uniform(0.0, 0.1, ("t", "r", "m")),
+        "material_shares_in_goods": normalize(data.uniform(0.1, 1, ("r", "m", "g")), 1),
+        "emission_capture_rate": 0.5 * t[:, 0, 0],
+        "carbon_content_materials": np.stack([carbon_content, 1.0 - carbon_content]),
+        "wasteimporttotal": 1e-3 * waste_trade,
+        "finalimporttotal": np.zeros(data.shape(("t",))),
+        "production": production,
+        "lifetime_mean": lifetime_mean,
+        "lifetime_std": 0.3 * lifetime_mean,
+        "population": population,
+        "gdppc": gdppc,
+    }
+
+
+def definition_and_items(model: str, args: argparse.Namespace) -> tuple:
+    cfg = SimpleNamespace(customization=SimpleNamespace(lifetime_model=fd.LogNormalLifetime))
+    items = {
+        "Time": list(range(args.first_year, args.last_year + 1)),
+        "Historic Time": list(range(args.first_year, args.last_historic_year + 1)),
+        "Region": [f"R{i + 1:03d}" for i in range(args.regions)],
+    }
+    if model == "steel":
+        # the default configuration uses the stock-driven model
+        definition = get_steel_definition(cfg, historic=False, stock_driven=True)
+        items["Good"] = item_names(STEEL_GOODS, args.goods or len(STEEL_GOODS), "Good")
+        items["Intermediate"] = [f"Intermediate {i + 1}" for i in range(args.intermediates)]
+        items["Scenario"] = ["SSP1", "SSP2", "SSP3", "SSP4", "SSP5"]
+        return definition, items, CustomDataReader.dimension_map, steel_values
+    if model == "cement":
+        definition = get_cement_definition(cfg)
+        n_stock_types = args.goods or len(CEMENT_STOCK_TYPES)
+        items["Stock Type"] = item_names(CEMENT_STOCK_TYPES, n_stock_types, "Stock Type")
+        return definition, items, CementDataReader.dimension_map, cement_values
+    if model == "plastics":
+        definition = get_plastics_definition(cfg)
+        items["Good"] = item_names(PLASTICS_GOODS, args.goods or len(PLASTICS_GOODS), "Good")
+        n_materials = args.materials or len(PLASTICS_MATERIALS)
+        items["Material"] = item_names(PLASTICS_MATERIALS, n_materials, "Material")
+        # the plastics model refers to these elements by name
+        items["Element"] = ["C", "Other Elements"]
+        return definition, items, CustomDataReader.dimension_map, plastics_values
+    raise ValueError(f"Unknown model {model}, must be one of {MODELS}.")
+
+
+def write_parameter(path: str, data: SyntheticData, letters: tuple, values: np.ndarray):
+    names = [data.names[letter] for letter in letters]
+    shape = data.shape(letters)
+    values = np.broadcast_to(values, shape)
+    rows = list(itertools.product(*[data.items[name] for name in names]))
+    df = pd.DataFrame(rows, columns=names) if names else pd.DataFrame(index=[0])
+    df["value"] = values.ravel()
+    df.to_csv(path, index=False)
+
+
+def generate(model: str, output_path: str, args: argparse.Namespace):
+    definition, items, dimension_map, get_values = definition_and_items(model, args)
+    data = SyntheticData(definition, items, seed=args.seed)
+
+    os.makedirs(os.path.join(output_path, "dimensions"), exist_ok=True)
+    os.makedirs(os.path.join(output_path, "datasets"), exist_ok=True)
+    for dimension in definition.dimensions:
+        path = os.path.join(output_path, "dimensions", f"{dimension_map[dimension.name]}.csv")
+        pd.DataFrame(items[dimension.name]).to_csv(path, index=False, header=False)
+
+    values = get_values(data)
+    for parameter in definition.parameters:
+        if parameter.name not in values:
+            raise KeyError(
+                f"No synthetic values for parameter {parameter.name} of the {model} model."
+            )
+        path = os.path.join(output_path, "datasets", f"{parameter.name}.csv")
+        write_parameter(path, data, parameter.dim_letters, values[parameter.name])
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Generate synthetic model input data.")
+    parser.add_argument("model", choices=MODELS)
+    parser.add_argument("output_path", help="Directory to write dimensions/ and datasets/ to.")
+    parser.add_argument("--regions", type=int, default=12)
+    parser.add_argument(
+        "--goods",
+        type=int,
+        default=None,
+        help="Number of goods, or stock types for cement. Defaults to the actual number.",
+    )
+    parser.add_argument("--intermediates", type=int, default=6, help="Steel only.")
+    parser.add_argument(
+        "--materials",
+        type=int,
+        default=None,
+        help="Plastics only. Defaults to the actual number.",
+    )
+    parser.add_argument("--first-year", type=int, default=1900)
+    parser.add_argument("--last-historic-year", type=int, default=2022)
+    parser.add_argument("--last-year", type=int, default=2100)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    generate(args.model, args.output_path, args)
+    print(f"Synthetic {args.model} data written to {args.output_path}.")